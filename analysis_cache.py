@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def normalize_description(text: str) -> str:
+    """Collapse whitespace so re-pasted copies of a posting share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(description: str, bias_fingerprint: str, model_name: str) -> str:
+    """Content address of an analysis: description text, bias rules and model."""
+    payload = "\x00".join([normalize_description(description), bias_fingerprint, model_name])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, db_path: Optional[str] = "analysis_cache.db", max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100000, ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 evict_every: int = 256):
+        """Two-tier cache of analysis results: an in-process LRU and an optional SQLite file.
+
+        Args:
+            db_path: SQLite file for the persistent tier, or None for memory only.
+            max_memory_entries: Entries kept in the in-process LRU.
+            max_disk_entries: Entries kept on disk; least recently used go first.
+            ttl_seconds: Age after which an entry is treated as missing, or None.
+            evict_every: Number of disk writes between eviction passes.
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+        self._writes = 0
+        self._memory = OrderedDict()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.conn = None
+        if db_path:
+            self._init_database(Path(db_path))
+
+    def _init_database(self, db_path: Path) -> None:
+        """Open the persistent tier and create its table."""
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)")
+        self.conn.commit()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: Any, created_at: float) -> None:
+        """Put an entry in the LRU tier, evicting the least recently used one."""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached analysis for key, or None on a miss."""
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry[1]):
+            self._memory.move_to_end(key)
+            self.hits["memory"] += 1
+            return entry[0]
+        self._memory.pop(key, None)
+
+        if self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                self.conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.hits["disk"] += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Store an analysis (a response string or result dict) under key."""
+        now = time.time()
+        self._remember(key, value, now)
+        if self.conn is None:
+            return
+        self.conn.execute("""
+            INSERT OR REPLACE INTO analysis_cache (key, value, created_at, accessed_at)
+            VALUES (?, ?, ?, ?)
+        """, (key, json.dumps(value), now, now))
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict(now)
+        self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows and trim the disk tier to max_disk_entries."""
+        if self.ttl_seconds is not None:
+            self.conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.conn.execute("""
+            DELETE FROM analysis_cache WHERE key IN (
+                SELECT key FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        self._memory.clear()
+        if self.conn is not None:
+            self.conn.execute("DELETE FROM analysis_cache")
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes."""
+        hits = self.hits["memory"] + self.hits["disk"]
+        lookups = hits + self.misses
+        disk_entries = 0
+        if self.conn is not None:
+            disk_entries = self.conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        return {
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries
+        }
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,199 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from batch_journal import description_id
+from bias_matcher import DEFAULT_CATEGORIES, category_key
+from report_writer import next_free_path
+
+EXPORT_FORMATS = ("sqlite", "parquet")
+
+# Rows buffered before they are appended to the export
+DEFAULT_BATCH_SIZE = 500
+
+CATEGORY_COLUMNS = [f"{key}_count" for key in DEFAULT_CATEGORIES]
+
+ANALYSIS_COLUMNS = (["id", "description_id", "exported_at", "description_chars", "discrimination_score", "confidence_level",
+                     "flagged_term_count"] + CATEGORY_COLUMNS + ["other_category_count"])
+
+TERM_COLUMNS = ["analysis_id", "position", "term", "category", "categories", "severity",
+                "context_offset", "term_offset", "suggestion"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    description_id TEXT NOT NULL,
+    exported_at INTEGER NOT NULL,
+    description_chars INTEGER NOT NULL,
+    discrimination_score REAL,
+    confidence_level REAL,
+    flagged_term_count INTEGER NOT NULL,
+    {', '.join(f'{column} INTEGER NOT NULL' for column in CATEGORY_COLUMNS)},
+    other_category_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    analysis_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    category TEXT,
+    categories TEXT,
+    severity INTEGER,
+    context_offset INTEGER,
+    term_offset INTEGER,
+    suggestion TEXT,
+    PRIMARY KEY (analysis_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_terms_term ON terms(term);
+"""
+
+
+def _offset(text: str, fragment: str, start: int = 0) -> Optional[int]:
+    """Character offset of fragment in text, ignoring case; None when it does not occur."""
+    if not fragment:
+        return None
+    position = text.lower().find(fragment.lower(), start)
+    return position if position != -1 else None
+
+
+def flatten_analysis(item_id: str, description: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """One analyses row: score, confidence and the instance count of every category.
+
+    ``id`` is the item ID (the source posting's id when the input has one)
+    and ``description_id`` the content hash of the description.
+    """
+    counts = {key: details.get("count", 0)
+              for key, details in analysis.get("discrimination_categories", {}).items()}
+    row = {
+        "id": item_id,
+        "description_id": description_id(description),
+        "exported_at": int(time.time()),
+        "description_chars": len(description),
+        "discrimination_score": analysis.get("discrimination_score"),
+        "confidence_level": analysis.get("confidence_level"),
+        "flagged_term_count": len(analysis.get("flagged_terms", [])),
+    }
+    for key, column in zip(DEFAULT_CATEGORIES, CATEGORY_COLUMNS):
+        row[column] = counts.pop(key, 0)
+    row["other_category_count"] = sum(counts.values())
+    return row
+
+
+def flatten_terms(item_id: str, description: str, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One terms row per flagged term, with where its context and the term itself occur in the description.
+
+    ``category`` is the term's first category; ``categories`` lists all of
+    them, comma separated. Offsets are None when the model paraphrased the
+    context instead of quoting it.
+    """
+    rows = []
+    for position, term in enumerate(analysis.get("flagged_terms", [])):
+        categories = [category_key(category) for category in term.get("categories", [])]
+        context_offset = _offset(description, term.get("context", ""))
+        rows.append({
+            "analysis_id": item_id,
+            "position": position,
+            "term": term["term"],
+            "category": categories[0] if categories else None,
+            "categories": ",".join(categories),
+            "severity": term.get("severity"),
+            "context_offset": context_offset,
+            "term_offset": _offset(description, term["term"], context_offset or 0),
+            "suggestion": term.get("suggestion"),
+        })
+    return rows
+
+
+class AnalysisExporter:
+    def __init__(self, path: Union[str, Path], export_format: str = "sqlite", batch_size: int = DEFAULT_BATCH_SIZE):
+        """Export analyses as two flat tables for corpus-level queries.
+
+        ``analyses`` has one row per analysis and ``terms`` one row per
+        flagged term. Rows are buffered and appended ``batch_size`` at a time,
+        so memory stays bounded however large the corpus is. With ``sqlite``
+        path is a database file holding both tables; with ``parquet`` it is a
+        directory that receives analyses.parquet and terms.parquet (needs
+        pyarrow).
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        self.path = Path(path)
+        self.export_format = export_format
+        self.batch_size = batch_size
+        self.exported = 0
+        self._analyses: List[Dict[str, Any]] = []
+        self._terms: List[Dict[str, Any]] = []
+
+        if export_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+            self._pyarrow = pyarrow
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._schemas = {
+                "analyses": pyarrow.schema(
+                    [("id", pyarrow.string()), ("description_id", pyarrow.string()),
+                     ("exported_at", pyarrow.int64()),
+                     ("description_chars", pyarrow.int64()), ("discrimination_score", pyarrow.float64()),
+                     ("confidence_level", pyarrow.float64()), ("flagged_term_count", pyarrow.int64())]
+                    + [(column, pyarrow.int64()) for column in CATEGORY_COLUMNS + ["other_category_count"]]),
+                "terms": pyarrow.schema(
+                    [("analysis_id", pyarrow.string()), ("position", pyarrow.int64()), ("term", pyarrow.string()),
+                     ("category", pyarrow.string()), ("categories", pyarrow.string()),
+                     ("severity", pyarrow.int64()), ("context_offset", pyarrow.int64()),
+                     ("term_offset", pyarrow.int64()), ("suggestion", pyarrow.string())]),
+            }
+            self._writers = {}
+        else:
+            self.conn = sqlite3.connect(str(self.path))
+            self.conn.executescript(SCHEMA)
+
+    def add(self, item_id: str, description: str, analysis: Dict[str, Any]) -> None:
+        """Buffer an analysis, appending the buffered rows once batch_size analyses are waiting."""
+        self._analyses.append(flatten_analysis(item_id, description, analysis))
+        self._terms.extend(flatten_terms(item_id, description, analysis))
+        if len(self._analyses) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the buffered rows, one transaction (or row group) per table."""
+        if not self._analyses:
+            return
+        if self.export_format == "parquet":
+            self._append_parquet("analyses", self._analyses)
+            self._append_parquet("terms", self._terms)
+        else:
+            ids = [(row["id"],) for row in self._analyses]
+            with self.conn:
+                # A re-exported analysis replaces its earlier rows rather than adding to them
+                self.conn.executemany("DELETE FROM terms WHERE analysis_id = ?", ids)
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO analyses ({', '.join(ANALYSIS_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})",
+                    [[row[column] for column in ANALYSIS_COLUMNS] for row in self._analyses])
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO terms ({', '.join(TERM_COLUMNS)}) VALUES ({', '.join('?' * len(TERM_COLUMNS))})",
+                    [[row[column] for column in TERM_COLUMNS] for row in self._terms])
+        self.exported += len(self._analyses)
+        self._analyses = []
+        self._terms = []
+
+    def _append_parquet(self, table_name: str, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        schema = self._schemas[table_name]
+        if table_name not in self._writers:
+            # Parquet files cannot be appended to, so an existing export is continued in a new file
+            path = next_free_path(self.path / f"{table_name}.parquet")
+            self._writers[table_name] = self._pyarrow.parquet.ParquetWriter(str(path), schema)
+        self._writers[table_name].write_table(self._pyarrow.Table.from_pylist(rows, schema=schema))
+
+    def close(self) -> None:
+        self.flush()
+        if self.export_format == "parquet":
+            for writer in self._writers.values():
+                writer.close()
+        else:
+            self.conn.close()
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+
+from analysis_cache import AnalysisCache
+from batch_journal import description_id
+from instrumentation import REGISTRY, enable_trace, request_trace
+from job_bias_detector_args import JobBiasDetector
+from micro_batch import DEFAULT_TOKEN_BUDGET, estimate_item_tokens
+from model_backends import BACKEND_ENV_VAR, BACKENDS, create_backend
+
+# Descriptions waiting for a model slot before new ones are refused with 429
+DEFAULT_MAX_QUEUE = 256
+
+# How long the first description of a batch waits for others to share its request
+DEFAULT_MAX_WAIT = 0.02
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Largest request body accepted, and most descriptions in one /analyze/batch call
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_ITEMS = 100
+
+# Slowest a client may be sending its request before the connection is dropped
+READ_TIMEOUT = 30.0
+
+
+class QueueFull(Exception):
+    """The service has no room for more descriptions right now."""
+
+
+class AnalysisQueue:
+    def __init__(self, detector: JobBiasDetector, max_queue: int = DEFAULT_MAX_QUEUE,
+                 token_budget: int = DEFAULT_TOKEN_BUDGET, max_wait: float = DEFAULT_MAX_WAIT,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_items: int = 50):
+        """Queue descriptions from many clients and analyze them in micro-batches.
+
+        A description already queued or in flight is not queued again; its
+        callers share the one analysis. When a model slot frees up, the
+        dispatcher takes as many waiting descriptions as fit ``token_budget``
+        (waiting up to ``max_wait`` for company if the queue is empty) and
+        sends them as one packed request, so a burst of clients costs a
+        handful of requests. At most ``max_queue`` descriptions wait for a
+        slot; beyond that submit() raises QueueFull.
+        """
+        self.detector = detector
+        self.max_queue = max_queue
+        self.token_budget = token_budget
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.max_items = max_items
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.futures: Dict[str, asyncio.Future] = {}  # item ID -> analysis, while queued or in flight
+        self.in_flight = 0
+        self.counters = {"submitted": 0, "coalesced": 0, "rejected": 0, "batches": 0, "batch_items": 0,
+                         "failed": 0}
+        self._carry: Optional[Tuple[str, str]] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+
+    def depth(self) -> int:
+        """Descriptions waiting for a model slot."""
+        return self.queue.qsize() + (self._carry is not None)
+
+    def submit_many(self, descriptions: List[str]) -> List[asyncio.Future]:
+        """Queue descriptions, all or none, returning a future analysis for each."""
+        ids = [description_id(description) for description in descriptions]
+        new = {item_id: description for item_id, description in zip(ids, descriptions) if item_id not in self.futures}
+        if self.depth() + len(new) > self.max_queue:
+            self.counters["rejected"] += len(descriptions)
+            raise QueueFull(f"{self.depth()} descriptions already queued")
+        loop = asyncio.get_running_loop()
+        for item_id, description in new.items():
+            self.futures[item_id] = loop.create_future()
+            self.queue.put_nowait((item_id, description))
+        self.counters["submitted"] += len(descriptions)
+        self.counters["coalesced"] += len(descriptions) - len(new)
+        return [self.futures[item_id] for item_id in ids]
+
+    def submit(self, description: str) -> asyncio.Future:
+        return self.submit_many([description])[0]
+
+    async def _next_batch(self) -> List[Tuple[str, str]]:
+        """Wait for a description, then add the others that fit the token budget."""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self.queue.get()
+        batch = [first]
+        used = estimate_item_tokens(first[1])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_items:
+            if self.queue.empty():
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            cost = estimate_item_tokens(item[1])
+            if used + cost > self.token_budget:
+                # Starts the next batch instead
+                self._carry = item
+                break
+            batch.append(item)
+            used += cost
+        return batch
+
+    async def _dispatch(self) -> None:
+        slots = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            # A slot is taken before collecting, so descriptions pile up into fuller batches while all are busy
+            await slots.acquire()
+            batch = await self._next_batch()
+            task = asyncio.ensure_future(self._run_batch(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run_batch(self, batch: List[Tuple[str, str]]) -> None:
+        self.in_flight += len(batch)
+        self.counters["batches"] += 1
+        self.counters["batch_items"] += len(batch)
+        descriptions = [description for _, description in batch]
+        try:
+            # A packed batch is one model call, so its descriptions share a trace ID
+            with request_trace():
+                if len(batch) == 1:
+                    analyses = [await self.detector.analyze_job_description(descriptions[0], keep_history=False)]
+                else:
+                    analyses = await self.detector.analyze_packed(descriptions)
+        except Exception as e:
+            analyses = [self.detector._failed_analysis(description, f"Analysis failed: {str(e)}")
+                        for description in descriptions]
+        finally:
+            self.in_flight -= len(batch)
+        for (item_id, _), analysis in zip(batch, analyses):
+            if analysis.is_error:
+                self.counters["failed"] += 1
+            future = self.futures.pop(item_id)
+            if not future.done():
+                future.set_result(analysis)
+
+
+class AnalysisService:
+    def __init__(self, detector: JobBiasDetector, queue: AnalysisQueue):
+        """Minimal HTTP/1.1 JSON API in front of an AnalysisQueue.
+
+        POST /analyze        {"description": "..."} -> {"id": ..., "analysis": {...}}
+        POST /analyze/batch  {"descriptions": [...]} -> {"results": [{"id", "analysis" | "error"}, ...]}
+        GET  /health         queue and in-flight counts
+        GET  /metrics        Prometheus text format
+
+        A full queue answers 429 with Retry-After. Connections are kept
+        alive, so a client can send request after request over one socket.
+        """
+        self.detector = detector
+        self.queue = queue
+        self.started_at = time.time()
+        self.responses: Dict[Tuple[str, int], int] = {}
+        self.latency: Dict[str, List[float]] = {}  # path -> [count, total seconds]
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                start = time.perf_counter()
+                status, payload, extra_headers = await self._route(method, path, body)
+                self._observe(path, status, time.perf_counter() - start)
+                self._write_response(writer, status, payload, extra_headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except ValueError as e:
+            self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": str(e)}, {}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Parse one request; None once the client has closed the connection."""
+        line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise ValueError("Malformed request line")
+        headers = {}
+        while True:
+            header = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body larger than {MAX_BODY_BYTES} bytes")
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method.upper(), target.split('?', 1)[0], headers, body, keep_alive
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                        extra_headers: Dict[str, str], keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        status = HTTPStatus(status)
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)),
+                   "Connection": "keep-alive" if keep_alive else "close", **extra_headers}
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode('latin-1') + body)
+
+    def _observe(self, path: str, status: int, seconds: float) -> None:
+        key = (path, int(status))
+        self.responses[key] = self.responses.get(key, 0) + 1
+        count_and_total = self.latency.setdefault(path, [0, 0.0])
+        count_and_total[0] += 1
+        count_and_total[1] += seconds
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        routes = {
+            "/analyze": ("POST", self._analyze),
+            "/analyze/batch": ("POST", self._analyze_batch),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+        }
+        if path not in routes:
+            return HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {path}"}, {}
+        allowed, handler = routes[path]
+        if method != allowed:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Use {allowed} for {path}"}, {"Allow": allowed}
+        if allowed == "GET":
+            return await handler()
+        try:
+            request = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {str(e)}"}, {}
+        if not isinstance(request, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "Expected a JSON object"}, {}
+        try:
+            return await handler(request)
+        except QueueFull as e:
+            return HTTPStatus.TOO_MANY_REQUESTS, {"error": f"Queue full: {str(e)}"}, {"Retry-After": "1"}
+
+    async def _analyze(self, request: Dict[str, Any]) -> Tuple[int, Any, Dict[str, str]]:
+        description = request.get("description")
+        if not isinstance(description, str) or not description.strip():
+            return HTTPStatus.BAD_REQUEST, {"error": "'description' must be a non-empty string"}, {}
+        # Shielded so a client hanging up does not cancel an analysis other clients share
+        analysis = await asyncio.shield(self.queue.submit(description))
+        item_id = description_id(description)
+        if analysis.is_error:
+            return HTTPStatus.BAD_GATEWAY, {"id": item_id, "error": analysis.error}, {}
+        return HTTPStatus.OK, {"id": item_id, "analysis": analysis}, {}
+
+    async def _analyze_batch(self, request: Dict[str, Any]) -> Tuple[int, Any, Dict[str, str]]:
+        descriptions = request.get("descriptions")
+        if (not isinstance(descriptions, list) or not descriptions
+                or not all(isinstance(d, str) and d.strip() for d in descriptions)):
+            return HTTPStatus.BAD_REQUEST, {"error": "'descriptions' must be a non-empty list of strings"}, {}
+        if len(descriptions) > MAX_BATCH_ITEMS:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"At most {MAX_BATCH_ITEMS} descriptions"}, {}
+        analyses = await asyncio.shield(asyncio.gather(*self.queue.submit_many(descriptions)))
+        results = []
+        for description, analysis in zip(descriptions, analyses):
+            result = {"id": description_id(description)}
+            if analysis.is_error:
+                result["error"] = analysis.error
+            else:
+                result["analysis"] = analysis
+            results.append(result)
+        return HTTPStatus.OK, {"results": results}, {}
+
+    async def _health(self) -> Tuple[int, Any, Dict[str, str]]:
+        return HTTPStatus.OK, {"status": "ok", "uptime_seconds": round(time.time() - self.started_at, 1),
+                               "queued": self.queue.depth(), "in_flight": self.queue.in_flight}, {}
+
+    async def _metrics(self) -> Tuple[int, Any, Dict[str, str]]:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Any]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        metric("job_bias_http_responses_total", "counter", "HTTP responses by path and status",
+               [(f'{{path="{path}",status="{status}"}}', count)
+                for (path, status), count in sorted(self.responses.items())])
+        metric("job_bias_http_request_seconds", "summary", "Time to answer HTTP requests",
+               [(f'_count{{path="{path}"}}', count) for path, (count, _) in sorted(self.latency.items())]
+               + [(f'_sum{{path="{path}"}}', f"{total:.6f}") for path, (_, total) in sorted(self.latency.items())])
+        metric("job_bias_queue_depth", "gauge", "Descriptions waiting for a model slot", [("", self.queue.depth())])
+        metric("job_bias_in_flight", "gauge", "Descriptions being analyzed", [("", self.queue.in_flight)])
+        for name, value in self.queue.counters.items():
+            metric(f"job_bias_queue_{name}_total", "counter", f"Queue {name.replace('_', ' ')}", [("", value)])
+        metric("job_bias_model_calls_total", "counter", "Model requests made by the detector",
+               [("", self.detector.model_calls)])
+        for name, value in self.detector.client.stats().items():
+            if name != "concurrency_limit":
+                metric(f"job_bias_client_{name}_total", "counter", f"Model client {name}", [("", value)])
+        if self.detector.cache is not None:
+            stats = self.detector.cache.stats()
+            metric("job_bias_cache_lookups_total", "counter", "Analysis cache lookups by result",
+                   [('{result="memory_hit"}', stats["memory_hits"]), ('{result="disk_hit"}', stats["disk_hits"]),
+                    ('{result="miss"}', stats["misses"])])
+        # Pipeline step timings and sizes from the instrumentation registry
+        return HTTPStatus.OK, "\n".join(lines) + "\n" + REGISTRY.render(), {}
+
+
+async def serve(args) -> None:
+    cache = None if args.no_cache else AnalysisCache(args.cache_db)
+    backend_options = {}
+    if (args.backend or os.environ.get(BACKEND_ENV_VAR)) == "fake":
+        backend_options = {"latency": args.fake_latency, "error_rate": args.fake_error_rate}
+    # One warm detector for every client; history_window=0 keeps clients' analyses independent
+    detector = JobBiasDetector(backend=create_backend(args.backend, **backend_options), history_window=0,
+                               prescreen=args.prescreen, cache=cache, requests_per_second=args.rps,
+                               max_retries=args.max_retries, max_concurrency=args.concurrency)
+    queue = AnalysisQueue(detector, max_queue=args.max_queue, token_budget=args.token_budget,
+                          max_wait=args.max_wait, max_concurrency=args.concurrency)
+    service = AnalysisService(detector, queue)
+    queue.start()
+    server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+    print(f"Serving job bias analysis on http://{args.host}:{args.port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await queue.stop()
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='HTTP service analyzing job descriptions for bias.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+    python analysis_service.py --port 8080 --rps 5
+    python analysis_service.py --backend fake --fake-latency 0.5
+    curl -s localhost:8080/analyze -d '{"description": "Looking for a young rockstar"}'
+        """)
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'Descriptions waiting before requests get 429 (default: {DEFAULT_MAX_QUEUE})')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f'Model requests in flight at once (default: {DEFAULT_MAX_CONCURRENCY})')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f'Token budget of a packed request (default: {DEFAULT_TOKEN_BUDGET})')
+    parser.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT,
+                        help=f'Seconds a description waits for others to batch with (default: {DEFAULT_MAX_WAIT})')
+    parser.add_argument('--prescreen', choices=JobBiasDetector.PRESCREEN_MODES, default='off')
+    parser.add_argument('--cache-db', type=str, default='analysis_cache.db')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--rps', type=float, default=None, help='Maximum model requests per second')
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help='Model backend (default: $JOB_BIAS_BACKEND or gemini)')
+    parser.add_argument('--fake-latency', type=float, default=0.0)
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    parser.add_argument('--trace', type=str, default=None, metavar='FILE',
+                        help='Append a JSONL record of every pipeline step to FILE')
+    args = parser.parse_args()
+    if args.trace:
+        enable_trace(args.trace)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from analysis_cache import normalize_description
+
+
+def description_id(description: str) -> str:
+    """Stable content hash of a description; the item ID of records without an id of their own."""
+    return hashlib.sha256(normalize_description(description).encode('utf-8')).hexdigest()[:16]
+
+
+def record_id(record: Dict[str, str]) -> str:
+    """Item ID of an input record, used for journaling, report filenames and exports.
+
+    The record's own ``id`` when the input carries one (JSONL or CSV), so
+    results can be joined back to the source postings; otherwise its
+    description_id.
+    """
+    return record.get("id") or description_id(record["description"])
+
+
+class BatchJournal:
+    def __init__(self, path: str, resume: bool = False):
+        """Append-only JSONL record of the batch items that have finished.
+
+        Args:
+            path: Journal file.
+            resume: Keep an existing journal and treat its items as done;
+                otherwise any previous journal is discarded.
+        """
+        self.path = Path(path)
+        self.completed = set()
+        if resume and self.path.exists():
+            self._load()
+        elif self.path.exists():
+            self.path.unlink()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self) -> None:
+        """Read completed item IDs, ignoring a line torn by a crash mid-write."""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.completed.add(json.loads(line)["id"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+
+    def is_done(self, item_id: str) -> bool:
+        return item_id in self.completed
+
+    def record(self, item_id: str, analysis: Any) -> None:
+        """Append a finished item and its raw result, flushed so it survives a crash."""
+        self._file.write(json.dumps({"id": item_id, "completed_at": time.time(), "result": analysis}) + "\n")
+        self._file.flush()
+        self.completed.add(item_id)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from model_backends import FakeBackend
+from job_bias_detector_args import JobBiasDetector
+from feedback_store import INSERT_FEEDBACK, connect
+
+SAMPLE_DESCRIPTION = "We need a young, energetic salesperson who can work long hours!"
+
+
+async def _run_payload_batch(batch_size: int, history_window: Optional[int]) -> List[int]:
+    """Analyze batch_size descriptions sequentially and return each request size."""
+    detector = JobBiasDetector(backend=FakeBackend(), history_window=history_window)
+    await detector.analyze_multiple_descriptions([SAMPLE_DESCRIPTION] * batch_size)
+    return detector.model.request_sizes
+
+
+def bench_payload_size(batch_sizes: List[int], history_windows: List[Optional[int]]) -> None:
+    """Print the size of the last request of a batch for each history window."""
+    print(f"{'history window':>16} {'batch length':>13} {'last request (bytes)':>21} {'total sent (bytes)':>19}")
+    for window in history_windows:
+        label = "full" if window is None else str(window)
+        for batch_size in batch_sizes:
+            sizes = asyncio.run(_run_payload_batch(batch_size, window))
+            print(f"{label:>16} {batch_size:>13} {sizes[-1]:>21} {sum(sizes):>19}")
+
+
+async def _time_analyses(count: int, shared: bool) -> float:
+    """Return the mean seconds per analysis with a shared or per-analysis detector."""
+    detector = JobBiasDetector(backend=FakeBackend(), history_window=0) if shared else None
+    start = time.perf_counter()
+    for i in range(count):
+        if not shared:
+            # What the CLI and UI used to do on every click
+            detector = JobBiasDetector(backend=FakeBackend(), history_window=0)
+        await detector.analyze_job_description(f"{SAMPLE_DESCRIPTION} #{i}")
+    return (time.perf_counter() - start) / count
+
+
+def bench_detector_overhead(count: int) -> None:
+    """Print per-analysis overhead of building a detector per click versus reusing one.
+
+    The fake model has no latency, so the numbers are pure client-side
+    overhead. Credential loading is not included because it needs live
+    OAuth files; with Gemini it is paid once per process via get_credentials.
+    """
+    per_click = asyncio.run(_time_analyses(count, shared=False))
+    shared = asyncio.run(_time_analyses(count, shared=True))
+    print(f"detector per analysis: {per_click * 1e6:10.1f} us/analysis")
+    print(f"shared detector:       {shared * 1e6:10.1f} us/analysis")
+
+
+def bench_throughput(count: int, latency: float, concurrency_levels: List[int], error_rate: float,
+                     token_budget: Optional[int] = None) -> None:
+    """Print batch throughput against the fake backend for several concurrency levels."""
+    print(f"{'concurrency':>12} {'seconds':>9} {'items/s':>9} {'requests':>9} {'retries':>8} {'failed':>7}")
+    for concurrency in concurrency_levels:
+        backend = FakeBackend(latency=latency, error_rate=error_rate)
+        detector = JobBiasDetector(backend=backend, history_window=0, max_concurrency=concurrency)
+        detector.client.base_delay = latency
+        descriptions = [f"{SAMPLE_DESCRIPTION} #{i}" for i in range(count)]
+        start = time.perf_counter()
+        results = asyncio.run(detector.analyze_multiple_descriptions(descriptions, concurrency, token_budget))
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for result in results if result.is_error)
+        print(f"{concurrency:>12} {elapsed:>9.2f} {count / elapsed:>9.1f} {detector.model_calls:>9} "
+              f"{detector.client.counters['retries']:>8} {failed:>7}")
+
+
+async def _time_stream(latency: float) -> List[float]:
+    """Seconds until the dictionary preview, the first streamed term and the full result."""
+    detector = JobBiasDetector(backend=FakeBackend(latency=latency), history_window=0)
+    start = time.perf_counter()
+    marks = {}
+    async for kind, _ in detector.stream_analysis(SAMPLE_DESCRIPTION):
+        marks.setdefault(kind, time.perf_counter() - start)
+    return [marks.get("local", 0), marks.get("term", marks["result"]), marks["result"]]
+
+
+def bench_streaming(latency: float) -> None:
+    """Print perceived latency of streaming versus waiting for the whole response."""
+    blocking_start = time.perf_counter()
+    asyncio.run(JobBiasDetector(backend=FakeBackend(latency=latency), history_window=0)
+                .analyze_job_description(SAMPLE_DESCRIPTION))
+    blocking = time.perf_counter() - blocking_start
+    local, first_term, result = asyncio.run(_time_stream(latency))
+    print(f"blocking, full result:       {blocking:8.3f} s")
+    print(f"streaming, dictionary terms: {local:8.3f} s")
+    print(f"streaming, first model term: {first_term:8.3f} s")
+    print(f"streaming, full result:      {result:8.3f} s")
+
+
+def build_feedback_db(db_path: Path, rows: int, terms: int = 200, days: int = 365, seed: int = 0) -> None:
+    """Fill a feedback database with synthetic rows spread over the last `days` days.
+
+    Each term has its own helpful rate, so the report has terms in every class.
+    """
+    rng = random.Random(seed)
+    helpful_rates = [rng.random() for _ in range(terms)]
+    now = int(time.time())
+    conn = connect(db_path)
+    batch_size = 100000
+    for start in range(0, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - start)):
+            term = rng.randrange(terms)
+            batch.append((f"term{term}", f"suggestion{term}", rng.random() < helpful_rates[term],
+                          now - rng.randrange(days * 86400), '{"context": "synthetic"}'))
+        with conn:
+            conn.executemany(INSERT_FEEDBACK, batch)
+    conn.close()
+
+
+def _legacy_feedback_report(db_path: Path, days_back: int = 30, min_responses: int = 5) -> int:
+    """The report as it used to be built: raw GROUP BY, iterrows and a connection plus query per weak term."""
+    import pandas as pd
+    conn = sqlite3.connect(str(db_path))
+    df = pd.read_sql_query("""
+        SELECT term, original_suggestion, COUNT(*) as total_responses,
+               SUM(CASE WHEN is_helpful = 1 THEN 1 ELSE 0 END) as helpful_count,
+               AVG(CASE WHEN is_helpful = 1 THEN 1 ELSE 0 END) as helpful_ratio
+        FROM feedback WHERE timestamp >= ? GROUP BY term, original_suggestion ORDER BY helpful_ratio DESC
+    """, conn, params=(int(time.time()) - days_back * 86400,))
+    conn.close()
+    needs_improvement = []
+    for _, row in df[df['total_responses'] >= min_responses].iterrows():
+        if row['helpful_ratio'] < 0.25:
+            needs_improvement.append(row['term'])
+    for term in needs_improvement:
+        conn = sqlite3.connect(str(db_path))
+        context_df = pd.read_sql_query("SELECT context, is_helpful FROM feedback WHERE term = ?", conn, params=(term,))
+        conn.close()
+        (context_df['is_helpful'] == 1).sum()
+    return len(needs_improvement)
+
+
+def _current_feedback_report(db_path: Path) -> int:
+    from feedback_processor import FeedbackProcessor
+    processor = FeedbackProcessor(db_path)
+    report = processor.generate_improvement_report()
+    processor.get_context_stats(item['term'] for item in report["needs_improvement"])
+    processor.close()
+    return len(report["needs_improvement"])
+
+
+def bench_feedback_report(rows: int, terms: int) -> None:
+    """Print improvement report time on a synthetic feedback.db, old code path versus current."""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "feedback.db"
+        start = time.perf_counter()
+        build_feedback_db(db_path, rows, terms)
+        print(f"built {rows} feedback rows in {time.perf_counter() - start:.1f} s")
+        for label, run in (("row loop + query per term", _legacy_feedback_report),
+                           ("rollup + vectorized", _current_feedback_report)):
+            start = time.perf_counter()
+            weak_terms = run(db_path)
+            print(f"{label:>26}: {time.perf_counter() - start:8.3f} s ({weak_terms} terms need improvement)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the job bias analyzer.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    payload = subparsers.add_parser('payload', help='Request size as batch length grows')
+    payload.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 50, 100])
+
+    overhead = subparsers.add_parser('overhead', help='Per-analysis overhead of per-click detectors')
+    overhead.add_argument('--count', type=int, default=200)
+
+    throughput = subparsers.add_parser('throughput', help='Batch throughput against the fake backend')
+    throughput.add_argument('--count', type=int, default=200)
+    throughput.add_argument('--latency', type=float, default=0.05)
+    throughput.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    throughput.add_argument('--error-rate', type=float, default=0.0)
+    throughput.add_argument('--pack', type=int, default=None, metavar='TOKEN_BUDGET',
+                            help='Pack descriptions into requests of this token budget')
+
+    streaming = subparsers.add_parser('streaming', help='Time to first term when streaming')
+    streaming.add_argument('--latency', type=float, default=2.0)
+
+    feedback = subparsers.add_parser('feedback', help='Improvement report time on a synthetic feedback.db')
+    feedback.add_argument('--rows', type=int, default=1000000)
+    feedback.add_argument('--terms', type=int, default=200)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'payload':
+        bench_payload_size(args.batch_sizes, [None, 0, 2])
+    elif args.benchmark == 'overhead':
+        bench_detector_overhead(args.count)
+    elif args.benchmark == 'throughput':
+        bench_throughput(args.count, args.latency, args.concurrency, args.error_rate, args.pack)
+    elif args.benchmark == 'streaming':
+        bench_streaming(args.latency)
+    elif args.benchmark == 'feedback':
+        bench_feedback_report(args.rows, args.terms)
@@ -0,0 +1,116 @@
+import re
+from typing import Dict, Any, List
+
+# Category keys every analysis reports, even when nothing was found
+DEFAULT_CATEGORIES = ["age_discrimination", "unprofessional_language", "work_life_balance", "aggressive_language"]
+
+SENTENCE_BREAKS = ".!?\n"
+
+
+def category_key(category: str) -> str:
+    """Turn a bias_dict category such as 'work-life balance' into 'work_life_balance'."""
+    return re.sub(r'[^a-z0-9]+', '_', category.lower()).strip('_')
+
+
+def term_severity(categories: List[str]) -> int:
+    """Deterministic 1-5 severity for a dictionary term based on its categories."""
+    if "direct discrimination" in categories:
+        return 4
+    if "indirect discrimination" in categories:
+        return 3
+    return 2
+
+
+def summarize_categories(flagged_terms: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Build discrimination_categories (count, average severity, terms) from flagged terms."""
+    categories = {key: {"count": 0, "severity": 0, "terms": []} for key in DEFAULT_CATEGORIES}
+    for flagged in flagged_terms:
+        for category in flagged.get("categories", []):
+            details = categories.setdefault(category_key(category), {"count": 0, "severity": 0, "terms": []})
+            # Keep a running average severity per category
+            details["severity"] = (details["severity"] * details["count"] + flagged["severity"]) / (details["count"] + 1)
+            details["count"] += 1
+            if flagged["term"] not in details["terms"]:
+                details["terms"].append(flagged["term"])
+    return categories
+
+
+class BiasMatcher:
+    def __init__(self, bias_dict: Dict[str, Dict[str, Any]]):
+        """Compile every bias_dict term into one case-insensitive, word-bounded regex."""
+        self.bias_dict = bias_dict
+        self._lookup = {term.lower(): term for term in bias_dict}
+        # Longest terms first so multi-word phrases win over their prefixes
+        alternatives = sorted((re.escape(term) for term in bias_dict), key=len, reverse=True)
+        self.pattern = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b', re.IGNORECASE) if alternatives else None
+
+    def find(self, text: str) -> List[re.Match]:
+        """Return every dictionary term occurrence in text."""
+        if self.pattern is None:
+            return []
+        return list(self.pattern.finditer(text))
+
+    def has_matches(self, text: str) -> bool:
+        """Return True if text contains at least one dictionary term."""
+        return self.pattern is not None and self.pattern.search(text) is not None
+
+    def _context(self, text: str, start: int, end: int) -> str:
+        """Return the sentence around a match."""
+        sentence_start = max(text.rfind(c, 0, start) for c in SENTENCE_BREAKS) + 1
+        ends = [i for i in (text.find(c, end) for c in SENTENCE_BREAKS) if i != -1]
+        sentence_end = min(ends) + 1 if ends else len(text)
+        return text[sentence_start:sentence_end].strip()
+
+    def _replace(self, match: re.Match) -> str:
+        """Replacement text for a match, keeping a leading capital."""
+        replacement = self.bias_dict[self._lookup[match.group(0).lower()]]["replacement"]
+        if match.group(0)[0].isupper():
+            replacement = replacement[0].upper() + replacement[1:]
+        return replacement
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """Build an analysis in the model's JSON format from dictionary matches alone."""
+        flagged_terms = []
+        seen = set()
+
+        for match in self.find(text):
+            term = self._lookup[match.group(0).lower()]
+            context = self._context(text, match.start(), match.end())
+            if (term, context) in seen:
+                continue
+            seen.add((term, context))
+
+            entry = self.bias_dict[term]
+            severity = term_severity(entry["categories"])
+            flagged_terms.append({
+                "term": term,
+                "categories": list(entry["categories"]),
+                "context": context,
+                "explanation": entry["explanation"],
+                "suggestion": entry["replacement"],
+                "severity": severity,
+                "compounding_effects": ""
+            })
+
+        categories = summarize_categories(flagged_terms)
+        score = min(10, sum(term["severity"] for term in flagged_terms))
+        terms = [term["term"] for term in flagged_terms]
+        if flagged_terms:
+            summary = f"Dictionary terms found: {', '.join(dict.fromkeys(terms))}"
+            risk = "Potential discriminatory language found by the local bias dictionary"
+            improved = self.pattern.sub(self._replace, text)
+        else:
+            summary = "No terms from the bias dictionary were found"
+            risk = "No dictionary terms found"
+            improved = text
+
+        return {
+            "flagged_terms": flagged_terms,
+            "discrimination_score": score,
+            "confidence_level": 1 if not flagged_terms else 0.6,
+            "discrimination_categories": categories,
+            "compounding_effects_summary": summary,
+            "overall_risk_assessment": risk,
+            "improved_description": improved,
+            "source": "bias_dict"
+        }
@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from analysis_export import EXPORT_FORMATS, AnalysisExporter
+from batch_journal import BatchJournal, description_id, record_id
+from job_bias_detector_args import JobBiasDetector
+from job_ingest import FORMATS, iter_records
+from micro_batch import DEFAULT_TOKEN_BUDGET
+from model_backends import BACKEND_ENV_VAR, BACKENDS, create_backend
+from report_writer import OUTPUT_FORMATS, ReportWriter
+from text_chunking import DEFAULT_CHUNK_CHARS
+
+MANIFEST = "manifest.json"
+
+# A shard lock not touched for this long is assumed to belong to a dead worker
+DEFAULT_STALE_AFTER = 600.0
+
+# Seconds between checks while another host splits the corpus
+SPLIT_POLL_INTERVAL = 0.5
+
+
+def shard_of(item_id: str, shards: int) -> int:
+    """Shard for a description_id; stable across processes and hosts."""
+    return int(item_id, 16) % shards
+
+
+def shard_name(shard: int) -> str:
+    return f"shard-{shard:04d}"
+
+
+def _create_lock(path: Path) -> bool:
+    """Atomically create path, recording the owner in it; False if it already exists."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, f"{socket.gethostname()} {os.getpid()} {time.time()}\n".encode())
+    os.close(fd)
+    return True
+
+
+class CorpusRun:
+    def __init__(self, run_dir: str):
+        """Files of a sharded run, all under run_dir on a filesystem shared by every host.
+
+        inputs/shard-N.jsonl   descriptions of shard N, written once by the split step
+        outputs/shard-N.jsonl  BatchJournal of shard N's finished analyses
+        locks/shard-N.lock     held by the worker processing shard N
+        outputs/shard-N.done   written when every description of shard N succeeded
+        """
+        self.root = Path(run_dir)
+        self.inputs = self.root / "inputs"
+        self.outputs = self.root / "outputs"
+        self.locks = self.root / "locks"
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        path = self.root / MANIFEST
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def input_path(self, shard: int) -> Path:
+        return self.inputs / f"{shard_name(shard)}.jsonl"
+
+    def output_path(self, shard: int) -> Path:
+        return self.outputs / f"{shard_name(shard)}.jsonl"
+
+    def done_path(self, shard: int) -> Path:
+        return self.outputs / f"{shard_name(shard)}.done"
+
+    def lock_path(self, shard: int) -> Path:
+        return self.locks / f"{shard_name(shard)}.lock"
+
+    def is_done(self, shard: int) -> bool:
+        return self.done_path(shard).exists()
+
+    def split(self, input_file: str, input_format: str, shards: int) -> Dict[str, Any]:
+        """Write each description to its shard's input file, then the manifest.
+
+        Every host runs the same command; the first to create split.lock
+        splits the corpus and the others wait for the manifest. A manifest
+        for a different shard count is an error rather than a silent re-split.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock = self.root / "split.lock"
+        while True:
+            manifest = self.manifest()
+            if manifest is not None:
+                if manifest["shards"] != shards:
+                    raise ValueError(f"{self.root} was split into {manifest['shards']} shards, not {shards}")
+                return manifest
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                time.sleep(SPLIT_POLL_INTERVAL)
+
+        try:
+            for directory in (self.inputs, self.outputs, self.locks):
+                directory.mkdir(exist_ok=True)
+            files = [open(self.input_path(shard), 'w', encoding='utf-8') for shard in range(shards)]
+            counts = [0] * shards
+            try:
+                for record in iter_records(input_file, input_format):
+                    # Sharded by content so a repeated description always lands in the same shard
+                    shard = shard_of(description_id(record["description"]), shards)
+                    item = {"id": record_id(record), "description": record["description"]}
+                    files[shard].write(json.dumps(item) + "\n")
+                    counts[shard] += 1
+            finally:
+                for f in files:
+                    f.close()
+            manifest = {"input": str(input_file), "shards": shards, "items": sum(counts), "shard_items": counts,
+                        "created_at": time.time()}
+            # Written last and renamed into place, so a manifest always means the inputs are complete
+            tmp = self.root / f"{MANIFEST}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self.root / MANIFEST)
+            return manifest
+        finally:
+            lock.unlink()
+
+    def claim(self, shard: int, stale_after: float = DEFAULT_STALE_AFTER) -> bool:
+        """Take the shard's lock file, or a stale one left behind by a dead worker.
+
+        O_EXCL creation is atomic on a shared filesystem, so exactly one
+        worker on one host gets each shard.
+        """
+        lock = self.lock_path(shard)
+        if _create_lock(lock):
+            return True
+        return self._take_over(lock, stale_after)
+
+    def _take_over(self, lock: Path, stale_after: float) -> bool:
+        """Replace a lock not touched for stale_after seconds.
+
+        Only the worker that creates the lock's .takeover file may check and
+        replace it; otherwise a worker that saw the old lock as stale could
+        move aside the lock another worker had just taken over.
+        """
+        guard = lock.with_name(f"{lock.name}.takeover")
+        if not _create_lock(guard):
+            try:
+                # Left by a worker that died mid-takeover; cleared so a later claim can retry
+                if time.time() - guard.stat().st_mtime >= stale_after:
+                    guard.unlink()
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            try:
+                if time.time() - lock.stat().st_mtime < stale_after:
+                    return False
+                os.rename(lock, lock.with_name(f"{lock.name}.stale.{socket.gethostname()}.{os.getpid()}"))
+            except FileNotFoundError:
+                pass
+            return _create_lock(lock)
+        finally:
+            guard.unlink()
+
+    def heartbeat(self, shard: int) -> None:
+        """Mark the shard's lock as still in use."""
+        os.utime(self.lock_path(shard))
+
+    def release(self, shard: int) -> None:
+        try:
+            self.lock_path(shard).unlink()
+        except FileNotFoundError:
+            pass
+
+    def iter_inputs(self, shard: int) -> Iterator[Tuple[str, str]]:
+        with open(self.input_path(shard), 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                yield record["id"], record["description"]
+
+    def iter_results(self, shard: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Finished analyses of a shard, once each, skipping a line torn by a crash."""
+        path = self.output_path(shard)
+        if not path.exists():
+            return
+        seen = set()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record["id"] not in seen:
+                    seen.add(record["id"])
+                    yield record["id"], record["result"]
+
+
+async def _process_shard(run: CorpusRun, shard: int, detector: JobBiasDetector, concurrency: int,
+                         token_budget: Optional[int]) -> Dict[str, int]:
+    """Analyze the descriptions of a shard not yet in its output journal."""
+    journal = BatchJournal(run.output_path(shard), resume=True)
+    item_ids = []
+    counts = {"analyzed": 0, "failed": 0, "skipped": 0}
+
+    def pending():
+        for item_id, description in run.iter_inputs(shard):
+            if journal.is_done(item_id):
+                counts["skipped"] += 1
+                continue
+            item_ids.append(item_id)
+            yield description
+
+    try:
+        async for index, analysis in detector.analyze_stream(pending(), concurrency, token_budget):
+            if analysis.is_error:
+                counts["failed"] += 1
+            else:
+                journal.record(item_ids[index], analysis)
+                counts["analyzed"] += 1
+            run.heartbeat(shard)
+    finally:
+        journal.close()
+    if not counts["failed"]:
+        with open(run.done_path(shard), 'w', encoding='utf-8') as f:
+            json.dump({**counts, "host": socket.gethostname(), "finished_at": time.time()}, f)
+    return counts
+
+
+async def _run_worker(options: Dict[str, Any]) -> Dict[str, Any]:
+    run = CorpusRun(options["run_dir"])
+    shards = run.manifest()["shards"]
+    backend_options = options["backend_options"]
+    detector = JobBiasDetector(backend=create_backend(options["backend"], **backend_options),
+                               history_window=0, prescreen=options["prescreen"],
+                               requests_per_second=options["rps"], max_retries=options["max_retries"],
+                               chunk_chars=options["chunk_chars"], max_concurrency=options["concurrency"])
+    stats = {"worker": options["worker"], "pid": os.getpid(), "shards": [],
+             "analyzed": 0, "failed": 0, "skipped": 0}
+    # Workers start at different shards so they rarely race for the same lock
+    start = options["worker"] * shards // options["workers"]
+    for shard in [(start + offset) % shards for offset in range(shards)]:
+        if run.is_done(shard) or not run.claim(shard, options["stale_after"]):
+            continue
+        try:
+            counts = await _process_shard(run, shard, detector, options["concurrency"], options["pack"])
+        finally:
+            run.release(shard)
+        stats["shards"].append(shard)
+        for key, value in counts.items():
+            stats[key] += value
+    return stats
+
+
+def run_worker(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Process entry point: claim and analyze shards until none are left, with its own detector."""
+    return asyncio.run(_run_worker(options))
+
+
+def run_corpus(args) -> None:
+    run = CorpusRun(args.run_dir)
+    try:
+        manifest = run.split(args.file, args.format, args.shards)
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        return
+    print(f"{manifest['items']} descriptions in {manifest['shards']} shards under {run.root}")
+
+    backend_options = {}
+    if (args.backend or os.environ.get(BACKEND_ENV_VAR)) == "fake":
+        backend_options = {"latency": args.fake_latency, "error_rate": args.fake_error_rate}
+    options = {
+        "run_dir": args.run_dir, "workers": args.workers, "backend": args.backend,
+        "backend_options": backend_options, "prescreen": args.prescreen,
+        # Each worker gets an equal share of this host's request rate
+        "rps": args.rps / args.workers if args.rps else None,
+        "max_retries": args.max_retries, "chunk_chars": args.chunk_chars,
+        "concurrency": args.concurrency, "pack": args.pack, "stale_after": args.stale_after,
+    }
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, {**options, "worker": worker}) for worker in range(args.workers)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    for stats in results:
+        print(f"Worker {stats['worker']} (pid {stats['pid']}): {len(stats['shards'])} shards, "
+              f"{stats['analyzed']} analyzed, {stats['failed']} failed, {stats['skipped']} already done")
+    analyzed = sum(stats["analyzed"] for stats in results)
+    print(f"Analyzed {analyzed} descriptions in {elapsed:.1f}s ({analyzed / elapsed if elapsed else 0:.1f}/s)")
+
+    remaining = [shard for shard in range(manifest["shards"]) if not run.is_done(shard)]
+    in_progress = [shard for shard in remaining if run.lock_path(shard).exists()]
+    if in_progress:
+        print(f"{len(in_progress)} shards are still being processed by other hosts")
+    if len(remaining) > len(in_progress):
+        print(f"{len(remaining) - len(in_progress)} shards had failures; rerun the same command to retry them")
+    if not remaining and args.merge:
+        merge_corpus(args)
+
+
+async def _merge(run: CorpusRun, shards: List[int], writer: ReportWriter,
+                 exporter: Optional[AnalysisExporter]) -> int:
+    merged = 0
+    for shard in shards:
+        descriptions = dict(run.iter_inputs(shard)) if exporter is not None else {}
+        for item_id, analysis in run.iter_results(shard):
+            await writer.write(item_id, analysis)
+            if exporter is not None:
+                exporter.add(item_id, descriptions[item_id], analysis)
+            merged += 1
+    await writer.close()
+    return merged
+
+
+def merge_corpus(args) -> None:
+    """Combine the per-shard outputs into reports, a consolidated file and/or an export."""
+    run = CorpusRun(args.run_dir)
+    manifest = run.manifest()
+    if manifest is None:
+        print(f"Error: {run.root} has no {MANIFEST}; run the corpus first")
+        return
+    shards = list(range(manifest["shards"]))
+    unfinished = [shard for shard in shards if not run.is_done(shard)]
+    if unfinished and not args.partial:
+        print(f"Error: {len(unfinished)} of {len(shards)} shards are not finished; use --partial to merge anyway")
+        return
+
+    output_dir = run.root / "merged"
+    output_dir.mkdir(exist_ok=True)
+    try:
+        exporter = AnalysisExporter(args.export, args.export_format) if args.export else None
+        writer = ReportWriter(output_dir, args.output_format)
+    except RuntimeError as e:
+        print(f"Error: {str(e)}")
+        return
+    try:
+        merged = asyncio.run(_merge(run, shards, writer, exporter))
+    finally:
+        if exporter is not None:
+            exporter.close()
+    print(f"Merged {merged} of {manifest['items']} analyses into {writer.path}")
+    if exporter is not None:
+        print(f"Exported {exporter.exported} analyses to {exporter.path}")
+
+
+def _add_merge_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='jsonl',
+                        help='Merged output: one .txt report per description, or a single analyses.jsonl '
+                             'or analyses.parquet in RUN_DIR/merged (default: jsonl)')
+    parser.add_argument('--export', type=str, default=None, metavar='PATH',
+                        help='Also export scores, category counts and flagged terms as flat tables to PATH')
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default='sqlite')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Analyze a large corpus in hash shards across processes and hosts sharing a filesystem.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+    python corpus_runner.py run -f postings.jsonl --shards 64 -w 8 --rps 20 runs/backfill
+    python corpus_runner.py run --backend fake -f postings.jsonl --shards 8 -w 4 --merge runs/test
+    python corpus_runner.py merge --export corpus.db runs/backfill
+        """)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Split the corpus (once) and process unclaimed shards')
+    run_parser.add_argument('run_dir', help='Run directory, shared by every host working on the corpus')
+    run_parser.add_argument('-f', '--file', type=str, required=True, help='Corpus of job descriptions')
+    run_parser.add_argument('--format', choices=FORMATS, default='auto',
+                            help='Input file format (default: auto, from the file extension)')
+    run_parser.add_argument('--shards', type=int, default=16,
+                            help='Number of shards; must be the same on every host (default: 16)')
+    run_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes on this host (default: CPU count)')
+    run_parser.add_argument('-c', '--concurrency', type=int, default=4,
+                            help='Descriptions each worker analyzes at the same time (default: 4)')
+    run_parser.add_argument('--rps', type=float, default=None,
+                            help='Model requests per second for this host, split evenly between its workers '
+                                 '(default: unlimited)')
+    run_parser.add_argument('--max-retries', type=int, default=3)
+    run_parser.add_argument('--pack', type=int, nargs='?', const=DEFAULT_TOKEN_BUDGET, default=None, metavar='TOKEN_BUDGET')
+    run_parser.add_argument('--chunk-chars', type=int, default=DEFAULT_CHUNK_CHARS)
+    run_parser.add_argument('--prescreen', choices=JobBiasDetector.PRESCREEN_MODES, default='off')
+    run_parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                            help='Model backend (default: $JOB_BIAS_BACKEND or gemini)')
+    run_parser.add_argument('--fake-latency', type=float, default=0.0)
+    run_parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--stale-after', type=float, default=DEFAULT_STALE_AFTER,
+                            help='Seconds after which a shard lock without progress is taken over '
+                                 f'(default: {DEFAULT_STALE_AFTER:.0f})')
+    run_parser.add_argument('--merge', action='store_true', help='Merge the outputs once every shard is done')
+    _add_merge_arguments(run_parser)
+
+    merge_parser = subparsers.add_parser('merge', help='Combine the per-shard outputs')
+    merge_parser.add_argument('run_dir')
+    merge_parser.add_argument('--partial', action='store_true', help='Merge even if some shards are unfinished')
+    _add_merge_arguments(merge_parser)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        args.partial = False
+        run_corpus(args)
+    else:
+        merge_corpus(args)
@@ -0,0 +1,134 @@
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+DEFAULT_RESPONSE = {
+    "flagged_terms": [],
+    "discrimination_score": 0,
+    "confidence_level": 1,
+    "discrimination_categories": {
+        "age_discrimination": {"count": 0, "severity": 0, "terms": []},
+        "unprofessional_language": {"count": 0, "severity": 0, "terms": []},
+        "work_life_balance": {"count": 0, "severity": 0, "terms": []},
+        "aggressive_language": {"count": 0, "severity": 0, "terms": []}
+    },
+    "compounding_effects_summary": "No biased terms detected",
+    "overall_risk_assessment": "Low risk",
+    "improved_description": ""
+}
+
+
+class FakeThrottleError(Exception):
+    """Stand-in for google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+    code = 429
+
+    def __init__(self, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+        super().__init__("429 Resource has been exhausted (e.g. check quota).")
+
+
+class FakeServiceError(Exception):
+    """Stand-in for google.api_core.exceptions.ServiceUnavailable (HTTP 503)."""
+    code = 503
+
+    def __init__(self):
+        super().__init__("503 The service is currently unavailable.")
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str = 'fake', system_instruction: Optional[str] = None,
+                 latency: float = 0.0, responses: Optional[List[Union[str, Dict[str, Any]]]] = None,
+                 analyzer: Optional[Callable[[str], Any]] = None,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, timeout_rate: float = 0.0,
+                 retry_after: Optional[float] = None, seed: int = 0, stream_chunk_chars: int = 64):
+        """Local stand-in for genai.GenerativeModel that sleeps instead of calling the API.
+
+        The sleep is blocking on purpose, like the real client, so it shows
+        whether the caller keeps the event loop free while a request is in flight.
+        Responses cycle through ``responses`` (dicts or raw text) when given,
+        otherwise come from ``analyzer`` applied to the last prompt, otherwise
+        are an empty analysis. ``throttle_rate``, ``error_rate`` and
+        ``timeout_rate`` are the fractions of calls that raise
+        FakeThrottleError, FakeServiceError or TimeoutError, drawn from a
+        seeded RNG. With ``stream=True`` the response text arrives in pieces
+        of ``stream_chunk_chars``, with the latency spread across them.
+        """
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.retry_after = retry_after
+        self.stream_chunk_chars = max(stream_chunk_chars, 1)
+        self._random = random.Random(seed)
+        self.responses = responses
+        self.analyzer = analyzer
+        self.calls = 0
+        self.request_sizes = []  # Serialized size in bytes of each request, system instruction included
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, contents, call_number: int) -> str:
+        """Response text for a request."""
+        if self.responses:
+            response = self.responses[(call_number - 1) % len(self.responses)]
+        elif self.analyzer is not None:
+            last = contents[-1] if isinstance(contents, list) and contents else contents
+            prompt = "\n".join(str(part) for part in last.get('parts', [])) if isinstance(last, dict) else str(last)
+            response = self.analyzer(prompt)
+        else:
+            response = DEFAULT_RESPONSE
+        return response if isinstance(response, str) else json.dumps(response)
+
+    def _stream(self, contents, call_number: int, timed_out: bool):
+        """Yield the response in chunks shaped like streamed google.generativeai responses."""
+        try:
+            text = self._respond(contents, call_number)
+            pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+            for position, piece in enumerate(pieces):
+                if self.latency:
+                    time.sleep(self.latency / len(pieces))
+                if timed_out and position == len(pieces) // 2:
+                    raise TimeoutError("Deadline exceeded")
+                yield SimpleNamespace(text=piece)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def generate_content(self, contents, stream: bool = False):
+        """Return a canned response shaped like a google.generativeai response."""
+        size = len(json.dumps([self.system_instruction, contents], default=str).encode('utf-8'))
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+            self.request_sizes.append(size)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            roll = self._random.random()
+        streaming = False
+        try:
+            if roll < self.throttle_rate:
+                raise FakeThrottleError(self.retry_after)
+            if roll < self.throttle_rate + self.error_rate:
+                raise FakeServiceError()
+            if stream:
+                # The generator releases the in-flight slot once it is exhausted
+                streaming = True
+                return self._stream(contents, call_number, roll < self.throttle_rate + self.error_rate + self.timeout_rate)
+            if self.latency:
+                time.sleep(self.latency)
+            if roll < self.throttle_rate + self.error_rate + self.timeout_rate:
+                raise TimeoutError("Deadline exceeded")
+            text = self._respond(contents, call_number)
+            content = {'role': 'model', 'parts': [text]}
+            return SimpleNamespace(text=text, candidates=[SimpleNamespace(content=content)])
+        finally:
+            if not streaming:
+                with self._lock:
+                    self.in_flight -= 1
@@ -1,53 +1,90 @@
 import pandas as pd
 from datetime import datetime, timedelta
-import sqlite3
 from pathlib import Path
+from feedback_store import SECONDS_PER_DAY, connect
+
+# SQLite's default limit on bound parameters is 999 in older builds
+MAX_QUERY_PARAMS = 900
 
 class FeedbackProcessor:
     def __init__(self, db_path="feedback.db"):
         self.db_path = Path(db_path)
+        self._conn = None
+    
+    @property
+    def conn(self):
+        """One connection reused by every query; connect() also migrates old databases"""
+        if self._conn is None:
+            self._conn = connect(self.db_path)
+        return self._conn
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
         
     def get_feedback_summary(self, days_back=30):
-        """Get summary of feedback for the specified time period"""
-        conn = sqlite3.connect(str(self.db_path))
-        
-        # Calculate date range
+        """Get summary of feedback for the specified time period
+
+        Reads the per-day rollup rather than the raw feedback, so the window
+        is counted in whole UTC days, including today.
+        """
+        # Calculate date range in days since the epoch, the rollup's key
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days_back)
+        start_day = int(start_date.timestamp()) // SECONDS_PER_DAY
         
         # Query feedback data
         query = """
             SELECT 
                 term,
                 original_suggestion,
-                COUNT(*) as total_responses,
-                SUM(CASE WHEN is_helpful = 1 THEN 1 ELSE 0 END) as helpful_count,
-                AVG(CASE WHEN is_helpful = 1 THEN 1 ELSE 0 END) as helpful_ratio
-            FROM feedback
-            WHERE timestamp >= ?
+                SUM(total) as total_responses,
+                SUM(helpful) as helpful_count,
+                CAST(SUM(helpful) AS REAL) / SUM(total) as helpful_ratio
+            FROM feedback_daily
+            WHERE day >= ?
             GROUP BY term, original_suggestion
+            HAVING SUM(total) > 0
             ORDER BY helpful_ratio DESC
         """
         
-        df = pd.read_sql_query(query, conn, params=(start_date,))
-        conn.close()
-        
-        return df
+        return pd.read_sql_query(query, self.conn, params=(start_day,))
     
     def get_context_analysis(self, term):
         """Analyze contexts where a term appears"""
-        conn = sqlite3.connect(str(self.db_path))
-        
         query = """
             SELECT context, is_helpful
             FROM feedback
             WHERE term = ?
         """
         
-        df = pd.read_sql_query(query, conn, params=(term,))
-        conn.close()
-        
-        return df
+        return pd.read_sql_query(query, self.conn, params=(term,))
+    
+    def get_context_stats(self, terms):
+        """Count contexts and helpful contexts for many terms with one grouped query per 900 terms
+
+        Counts come from the daily rollup, so they cover all feedback with a
+        timestamp. Returns a DataFrame indexed by term with total_contexts and
+        helpful_contexts.
+        """
+        terms = list(dict.fromkeys(terms))
+        frames = []
+        for start in range(0, len(terms), MAX_QUERY_PARAMS):
+            batch = terms[start:start + MAX_QUERY_PARAMS]
+            query = f"""
+                SELECT
+                    term,
+                    SUM(total) as total_contexts,
+                    SUM(helpful) as helpful_contexts
+                FROM feedback_daily
+                WHERE term IN ({', '.join('?' * len(batch))})
+                GROUP BY term
+            """
+            frames.append(pd.read_sql_query(query, self.conn, params=batch))
+        stats = pd.concat(frames) if frames else pd.DataFrame(columns=["term", "total_contexts", "helpful_contexts"])
+        # Terms without any feedback rows still get a zero entry
+        return stats.set_index("term").reindex(terms, fill_value=0)
     
     def generate_improvement_report(self, min_responses=5):
         """Generate a report of potential improvements based on feedback"""
@@ -56,34 +93,28 @@ class FeedbackProcessor:
         # Filter for terms with sufficient feedback
         df_filtered = df[df['total_responses'] >= min_responses]
         
+        # Classify every row at once with boolean masks
+        needs_improvement = df_filtered[df_filtered['helpful_ratio'] < 0.25]
+        successful = df_filtered[df_filtered['helpful_ratio'] > 0.5]
+        columns = ['term', 'original_suggestion', 'helpful_ratio', 'total_responses']
+        
         report = {
-            "needs_improvement": [],
-            "successful_suggestions": [],
+            "needs_improvement": needs_improvement[columns]
+                .rename(columns={'original_suggestion': 'current_suggestion'}).to_dict('records'),
+            "successful_suggestions": successful[columns]
+                .rename(columns={'original_suggestion': 'suggestion'}).to_dict('records'),
             "improvement_opportunities": []
         }
         
-        for _, row in df_filtered.iterrows():
-            if row['helpful_ratio'] < 0.25:
-                report["needs_improvement"].append({
-                    "term": row['term'],
-                    "current_suggestion": row['original_suggestion'],
-                    "helpful_ratio": row['helpful_ratio'],
-                    "total_responses": row['total_responses']
-                })
-            elif row['helpful_ratio'] > 0.5:
-                report["successful_suggestions"].append({
-                    "term": row['term'],
-                    "suggestion": row['original_suggestion'],
-                    "helpful_ratio": row['helpful_ratio'],
-                    "total_responses": row['total_responses']
-                })
-        
         return report
 
 def print_improvement_report():
     """Print a formatted improvement report"""
     processor = FeedbackProcessor()
     report = processor.generate_improvement_report()
+    # Context counts for every weak term in one query instead of one per term
+    context_stats = processor.get_context_stats(item['term'] for item in report["needs_improvement"])
+    processor.close()
     
     print("Bias Detection Model Improvement Report")
     print("=" * 50)
@@ -96,10 +127,10 @@ def print_improvement_report():
         print(f"  Total responses: {item['total_responses']}")
         
         # Get context analysis
-        context_df = processor.get_context_analysis(item['term'])
+        contexts = context_stats.loc[item['term']]
         print("\n  Context Analysis:")
-        print(f"  - Total contexts analyzed: {len(context_df)}")
-        print(f"  - Helpful in: {(context_df['is_helpful'] == 1).sum()} contexts")
+        print(f"  - Total contexts analyzed: {contexts['total_contexts']}")
+        print(f"  - Helpful in: {contexts['helpful_contexts']} contexts")
     
     print("\nSuccessful Suggestions:")
     for item in report["successful_suggestions"]:
@@ -0,0 +1,300 @@
+import atexit
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from instrumentation import FEEDBACK_ROWS, FEEDBACK_WRITE, timed
+
+DEFAULT_DB_PATH = "feedback.db"
+
+# How long a writer waits for another process's lock before SQLite gives up
+BUSY_TIMEOUT_MS = 5000
+
+# Stored in PRAGMA user_version; bump it and add a step to MIGRATIONS when the schema changes
+SCHEMA_VERSION = 2
+
+SECONDS_PER_DAY = 86400
+
+# Older CLI builds wrote datetime.now().isoformat().replace(":", "."), e.g. 2024-11-15T10.23.45.123456
+LEGACY_CLI_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2})\.(\d{2})\.(\d{2})(\.\d+)?$')
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        term TEXT,
+        original_suggestion TEXT,
+        is_helpful BOOLEAN,
+        timestamp INTEGER,  -- Unix epoch seconds
+        context TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_feedback_term_suggestion ON feedback (term, original_suggestion)",
+    # Covers the summary query, so a time window is answered from the index alone
+    "CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp, term, original_suggestion, is_helpful)",
+]
+
+INSERT_FEEDBACK = """
+    INSERT INTO feedback (term, original_suggestion, is_helpful, timestamp, context)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+FeedbackRow = Tuple[str, str, bool, Any, str]
+
+
+def to_epoch(timestamp: Any) -> Optional[int]:
+    """Convert a stored or given timestamp to Unix epoch seconds.
+
+    Accepts epoch numbers, datetimes (naive ones are local time, as
+    datetime.now() returns), ISO strings as the UI and sqlite3 wrote them, and
+    the legacy CLI format. Returns None for anything unreadable.
+    """
+    if timestamp is None or isinstance(timestamp, bool):
+        return None
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp())
+    text = str(timestamp).strip()
+    legacy = LEGACY_CLI_TIMESTAMP.match(text)
+    if legacy:
+        date, hours, minutes, seconds, fraction = legacy.groups()
+        text = f"{date}T{hours}:{minutes}:{seconds}{fraction or ''}"
+    try:
+        return int(datetime.fromisoformat(text).timestamp())
+    except ValueError:
+        return None
+
+
+def _migrate_epoch_timestamps(conn: sqlite3.Connection) -> None:
+    """Version 1: rewrite text timestamps of both legacy formats as integer epoch seconds.
+
+    Unreadable timestamps become NULL. The timestamp index is rebuilt as
+    the covering index in SCHEMA, replacing the single-column one.
+    """
+    rows = conn.execute("SELECT id, timestamp FROM feedback WHERE typeof(timestamp) != 'integer'").fetchall()
+    conn.executemany("UPDATE feedback SET timestamp = ? WHERE id = ?",
+                     [(to_epoch(timestamp), row_id) for row_id, timestamp in rows])
+    conn.execute("DROP INDEX IF EXISTS idx_feedback_timestamp")
+    conn.execute(SCHEMA[2])
+
+
+# feedback_daily holds one row per (UTC day, term, suggestion); the triggers keep it in step
+# with every insert, update and delete on feedback, so summaries never scan raw feedback
+DAILY_ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS feedback_daily (
+        day INTEGER NOT NULL,  -- Days since the Unix epoch (UTC)
+        term TEXT NOT NULL,
+        original_suggestion TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        helpful INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, term, original_suggestion)
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feedback_daily_insert AFTER INSERT ON feedback
+    WHEN NEW.timestamp IS NOT NULL
+    BEGIN
+        INSERT INTO feedback_daily (day, term, original_suggestion, total, helpful)
+        VALUES (NEW.timestamp / {SECONDS_PER_DAY}, COALESCE(NEW.term, ''), COALESCE(NEW.original_suggestion, ''),
+                1, CASE WHEN NEW.is_helpful = 1 THEN 1 ELSE 0 END)
+        ON CONFLICT (day, term, original_suggestion) DO UPDATE SET
+            total = total + 1,
+            helpful = helpful + excluded.helpful;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feedback_daily_delete AFTER DELETE ON feedback
+    WHEN OLD.timestamp IS NOT NULL
+    BEGIN
+        UPDATE feedback_daily SET
+            total = total - 1,
+            helpful = helpful - CASE WHEN OLD.is_helpful = 1 THEN 1 ELSE 0 END
+        WHERE day = OLD.timestamp / {SECONDS_PER_DAY}
+          AND term = COALESCE(OLD.term, '') AND original_suggestion = COALESCE(OLD.original_suggestion, '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS feedback_daily_update
+    AFTER UPDATE OF term, original_suggestion, is_helpful, timestamp ON feedback
+    BEGIN
+        UPDATE feedback_daily SET
+            total = total - 1,
+            helpful = helpful - CASE WHEN OLD.is_helpful = 1 THEN 1 ELSE 0 END
+        WHERE OLD.timestamp IS NOT NULL AND day = OLD.timestamp / {SECONDS_PER_DAY}
+          AND term = COALESCE(OLD.term, '') AND original_suggestion = COALESCE(OLD.original_suggestion, '');
+        INSERT INTO feedback_daily (day, term, original_suggestion, total, helpful)
+        SELECT NEW.timestamp / {SECONDS_PER_DAY}, COALESCE(NEW.term, ''), COALESCE(NEW.original_suggestion, ''),
+               1, CASE WHEN NEW.is_helpful = 1 THEN 1 ELSE 0 END
+        WHERE NEW.timestamp IS NOT NULL
+        ON CONFLICT (day, term, original_suggestion) DO UPDATE SET
+            total = total + 1,
+            helpful = helpful + excluded.helpful;
+    END
+    """,
+]
+
+
+def _create_daily_rollup(conn: sqlite3.Connection) -> None:
+    """Version 2: add the feedback_daily rollup with its triggers and backfill it from feedback."""
+    for statement in DAILY_ROLLUP_SCHEMA:
+        conn.execute(statement)
+    conn.execute("DELETE FROM feedback_daily")
+    conn.execute(f"""
+        INSERT INTO feedback_daily (day, term, original_suggestion, total, helpful)
+        SELECT timestamp / {SECONDS_PER_DAY}, COALESCE(term, ''), COALESCE(original_suggestion, ''),
+               COUNT(*), SUM(CASE WHEN is_helpful = 1 THEN 1 ELSE 0 END)
+        FROM feedback
+        WHERE timestamp IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+MIGRATIONS = [_migrate_epoch_timestamps, _create_daily_rollup]
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """Bring the schema up to SCHEMA_VERSION, running each pending migration once.
+
+    The check runs again inside a write transaction, so when several
+    processes open an old database at once only one of them migrates it.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in MIGRATIONS[version:SCHEMA_VERSION]:
+            step(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def connect(db_path: Union[str, Path] = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Open the feedback database in WAL mode and make sure the schema is current.
+
+    WAL lets readers (FeedbackProcessor) run while a CLI or UI process is
+    writing, and the busy timeout makes concurrent writers wait for each
+    other instead of failing with "database is locked".
+    """
+    conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    migrate(conn)
+    return conn
+
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class FeedbackStore:
+    def __init__(self, db_path: Union[str, Path] = DEFAULT_DB_PATH, flush_every: int = 50,
+                 flush_interval: float = 2.0, max_retries: int = 5):
+        """Buffered writer for feedback.db.
+
+        Rows are collected in memory and written with a single executemany in
+        one transaction, when ``flush_every`` rows are waiting, when
+        ``flush_interval`` seconds have passed since the last write, on an
+        explicit flush() and at interpreter exit.
+
+        Args:
+            db_path: SQLite file holding the feedback table.
+            flush_every: Buffered rows that trigger a write.
+            flush_interval: Seconds after which the next add() writes the buffer.
+            max_retries: Extra attempts when the database stays locked past the busy timeout.
+        """
+        self.db_path = Path(db_path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.conn = connect(self.db_path)
+        self._pending: List[FeedbackRow] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.rows_written = 0
+        atexit.register(self.close)
+
+    def add(self, term: str, suggestion: str, is_helpful: bool, context: str,
+            timestamp: Optional[datetime] = None) -> None:
+        """Queue one feedback row."""
+        self.add_many([(term, suggestion, is_helpful, timestamp, context)])
+
+    def add_many(self, rows: Iterable[FeedbackRow]) -> None:
+        """Queue several ``(term, suggestion, is_helpful, timestamp, context)`` rows; a None timestamp means now."""
+        with self._lock:
+            self._pending.extend(
+                (term, suggestion, bool(is_helpful), to_epoch(timestamp or datetime.now()), context)
+                for term, suggestion, is_helpful, timestamp, context in rows
+            )
+            due = (len(self._pending) >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write every buffered row in one transaction and return how many were written.
+
+        If the database stays locked through all retries the rows go back to
+        the buffer, so a later flush can still write them, and the error is raised.
+        """
+        with self._lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                self._last_flush = time.monotonic()
+                return 0
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with timed(FEEDBACK_WRITE), self.conn:
+                        self.conn.executemany(INSERT_FEEDBACK, rows)
+                    break
+                except sqlite3.OperationalError as e:
+                    if not _is_lock_error(e) or attempt == self.max_retries:
+                        self._pending = rows + self._pending
+                        raise
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            self._last_flush = time.monotonic()
+            self.rows_written += len(rows)
+            FEEDBACK_ROWS.inc(len(rows))
+            return len(rows)
+
+    def close(self) -> None:
+        """Flush the buffer and close the connection."""
+        if self.conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+            self.conn = None
+            _stores.pop(str(self.db_path.resolve()), None)
+            atexit.unregister(self.close)
+
+
+_stores: Dict[str, FeedbackStore] = {}
+
+
+def get_feedback_store(db_path: Union[str, Path] = DEFAULT_DB_PATH) -> FeedbackStore:
+    """Return the process-wide store for db_path, so every writer shares one connection and buffer."""
+    key = str(Path(db_path).resolve())
+    if key not in _stores:
+        _stores[key] = FeedbackStore(db_path)
+    return _stores[key]
@@ -0,0 +1,214 @@
+import asyncio
+import re
+from difflib import SequenceMatcher
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from response_parser import AnalysisResult, parse_analysis
+from text_chunking import merge_chunk_analyses, split_sentences
+
+# Most characters sent together when (re-)analyzing a run of changed sentences;
+# smaller segments mean more, but shorter, requests
+DEFAULT_SEGMENT_CHARS = 1000
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+class IncrementalAnalyzer:
+    """Re-analyze an edited description by sending only the sentences that changed.
+
+    Results are kept per sentence. After an edit the new text is diffed
+    sentence by sentence against the last analyzed version; unchanged
+    sentences keep their results, and only the changed sentences and their
+    neighbours go back to the model, grouped into segments of consecutive
+    sentences. Each segment's analysis is split back onto its sentences
+    (terms by the sentence they occur in) and the per-sentence results are
+    merged into one result with text_chunking.merge_chunk_analyses. Segment
+    results are also kept in the detector's AnalysisCache, so undoing an
+    edit costs no request.
+    """
+
+    def __init__(self, detector, segment_chars: int = DEFAULT_SEGMENT_CHARS, neighbours: int = 1):
+        self.detector = detector
+        self.segment_chars = segment_chars
+        self.neighbours = neighbours
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the previous version so the next call analyzes everything."""
+        self.text: Optional[str] = None
+        self.sentences: List[Tuple[str, str]] = []
+        self.results: List[AnalysisResult] = []
+        self.analysis: Optional[AnalysisResult] = None
+        self.last_stats = {"sentences_sent": 0, "sentences_reused": 0}
+
+    def _reusable_results(self, sentences: List[Tuple[str, str]]) -> Dict[int, AnalysisResult]:
+        """Map new sentence index -> previous result, for sentences untouched by the edit."""
+        if not self.sentences:
+            return {}
+        matcher = SequenceMatcher(None, [s for _, s in self.sentences], [s for _, s in sentences], autojunk=False)
+        moved: Dict[int, int] = {}
+        touched: Set[int] = set()
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                moved.update((j1 + k, i1 + k) for k in range(i2 - i1))
+            else:
+                # Neighbours are re-sent too, since an edit can change how they read
+                touched.update(range(j1 - self.neighbours, j2 + self.neighbours))
+        return {new: self.results[old] for new, old in moved.items() if new not in touched}
+
+    def _plan_segments(self, sentences: List[Tuple[str, str]],
+                       reusable: Dict[int, AnalysisResult]) -> List[Dict[str, Any]]:
+        """Group the runs of sentences that must be sent into segments of at most segment_chars."""
+        segments = []
+        position = 0
+        while position < len(sentences):
+            if position in reusable:
+                position += 1
+                continue
+            start = position
+            size = 0
+            while position < len(sentences) and position not in reusable:
+                separator, sentence = sentences[position]
+                cost = (len(separator) if position > start else 0) + len(sentence)
+                if position > start and size + cost > self.segment_chars:
+                    break
+                size += cost
+                position += 1
+            segments.append({"start": start, "end": position})
+        return segments
+
+    def _split_segment(self, sentences: List[Tuple[str, str]], segment: Dict[str, Any],
+                       analysis: AnalysisResult) -> List[AnalysisResult]:
+        """Split a segment's analysis into one result per sentence.
+
+        A term goes to the sentence its context quotes, else to the first
+        one containing the term. The score, summary and risk assessment go
+        to the sentences with terms (the first sentence if there are none),
+        so a sentence without terms does not keep a score after the edit
+        that removes the terms. The improved text is split the same way
+        when the rewrite has as many sentences as the original; otherwise
+        each sentence gets its terms replaced by their suggestions.
+        """
+        texts = [sentence for _, sentence in sentences[segment["start"]:segment["end"]]]
+        normalized = [_normalized(text) for text in texts]
+        terms: List[List[Dict[str, Any]]] = [[] for _ in texts]
+        for term in analysis.flagged_terms:
+            context, word = _normalized(term["context"]), _normalized(term["term"])
+            owner = next((i for i, text in enumerate(normalized) if context and (context in text or text in context)),
+                         next((i for i, text in enumerate(normalized) if word and word in text), 0))
+            terms[owner].append(term)
+
+        rewrites = [sentence for _, sentence in split_sentences(analysis.get("improved_description") or "")]
+        if len(rewrites) != len(texts):
+            rewrites = []
+            for text, sentence_terms in zip(texts, terms):
+                for term in sentence_terms:
+                    if term["term"] and term["suggestion"]:
+                        text = re.sub(re.escape(term["term"]), lambda _: term["suggestion"], text, flags=re.IGNORECASE)
+                rewrites.append(text)
+
+        carriers = [i for i, sentence_terms in enumerate(terms) if sentence_terms] or [0]
+        return [AnalysisResult({
+            "flagged_terms": terms[i],
+            "discrimination_score": analysis.discrimination_score if i in carriers else 0,
+            "confidence_level": analysis.confidence_level,
+            "compounding_effects_summary": analysis.get("compounding_effects_summary", "") if i in carriers else "",
+            "overall_risk_assessment": analysis.get("overall_risk_assessment", "") if i in carriers else "",
+            "improved_description": rewrites[i],
+        }) for i in range(len(texts))]
+
+    def _segment_chunk(self, sentences: List[Tuple[str, str]], segment: Dict[str, Any]) -> Dict[str, str]:
+        """Describe a segment the way text_chunking does: text, joining separator and context."""
+        start, end = segment["start"], segment["end"]
+        return {
+            "text": sentences[start][1] + "".join(sep + sentence for sep, sentence in sentences[start + 1:end]),
+            "separator": sentences[start][0],
+            "context": sentences[start - 1][1] if start else "",
+        }
+
+    async def _run_segment(self, chunk: Dict[str, str], events: asyncio.Queue) -> AnalysisResult:
+        """Stream one segment through the detector, forwarding its term events."""
+        analysis = None
+        async for kind, payload in self.detector.stream_analysis(chunk["text"], keep_history=False,
+                                                                context=chunk["context"]):
+            if kind == "term":
+                events.put_nowait(("term", payload))
+            elif kind == "result":
+                analysis = payload
+        return analysis
+
+    async def stream(self, text: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Analyze text, yielding events like JobBiasDetector.stream_analysis.
+
+        ``("local", analysis)`` is the dictionary match for the whole text;
+        ``("term", flagged_term)`` events come first for reused sentences and
+        then from the re-sent segments as they stream in; ``("result", analysis)``
+        is the merged analysis. A failed segment fails the whole analysis and
+        leaves the previous version in place, so the next call retries just
+        what is missing.
+        """
+        yield "local", parse_analysis(self.detector.matcher.analyze(text))
+        if text == self.text and self.analysis is not None:
+            self.last_stats = {"sentences_sent": 0, "sentences_reused": len(self.sentences)}
+            yield "result", self.analysis
+            return
+
+        sentences = split_sentences(text)
+        if not sentences:
+            yield "result", await self.detector.analyze_job_description(text, keep_history=False)
+            return
+
+        reusable = self._reusable_results(sentences)
+        segments = self._plan_segments(sentences, reusable)
+        for position in sorted(reusable):
+            for term in reusable[position].flagged_terms:
+                yield "term", term
+
+        events: asyncio.Queue = asyncio.Queue()
+        runs = asyncio.ensure_future(asyncio.gather(*(self._run_segment(self._segment_chunk(sentences, segment), events)
+                                                      for segment in segments)))
+        next_event = None
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({next_event, runs}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event not in done:
+                    break
+                yield next_event.result()
+            while not events.empty():
+                yield events.get_nowait()
+            analyses = runs.result()
+        finally:
+            # Also reached when the caller stops listening, e.g. a cancelled UI task
+            if next_event is not None:
+                next_event.cancel()
+            if not runs.done():
+                runs.cancel()
+                # Retrieve the outcome so asyncio does not warn about an unretrieved CancelledError
+                runs.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+        failed = next((analysis for analysis in analyses if analysis.is_error), None)
+        if failed is not None:
+            yield "result", self.detector._failed_analysis(text, failed.error)
+            return
+        results: List[Optional[AnalysisResult]] = [reusable.get(position) for position in range(len(sentences))]
+        for segment, analysis in zip(segments, analyses):
+            results[segment["start"]:segment["end"]] = self._split_segment(sentences, segment, analysis)
+
+        self.last_stats = {"sentences_sent": len(sentences) - len(reusable), "sentences_reused": len(reusable)}
+        self.text = text
+        self.sentences = sentences
+        self.results = results
+        self.analysis = merge_chunk_analyses([{"text": sentence, "separator": separator}
+                                              for separator, sentence in sentences], results)
+        yield "result", self.analysis
+
+    async def analyze(self, text: str) -> AnalysisResult:
+        """Analyze text, reusing the results of sentences unchanged since the last call."""
+        analysis = None
+        async for kind, payload in self.stream(text):
+            if kind == "result":
+                analysis = payload
+        return analysis
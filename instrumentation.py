@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Environment variable naming a JSONL file to trace every instrumented step to
+TRACE_ENV_VAR = "JOB_BIAS_TRACE"
+
+# Upper bounds in seconds, from a sub-millisecond parse to a slow model call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds in bytes for request and response sizes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # Per label set: a count per bucket (the last is +Inf), then the sum of observed values
+        self.values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        counts = self.values.get(_label_key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def total(self, **labels) -> float:
+        counts = self.values.get(_label_key(labels))
+        return counts[-1] if counts else 0.0
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {counts[-1]:.6g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CREDENTIAL_LOAD = REGISTRY.histogram("job_bias_credential_load_seconds",
+                                     "Loading or refreshing OAuth credentials")
+PROMPT_BUILD = REGISTRY.histogram("job_bias_prompt_build_seconds", "Building analysis prompts")
+MODEL_FIRST_BYTE = REGISTRY.histogram("job_bias_model_first_byte_seconds",
+                                      "Model call start to the first response text")
+MODEL_TOTAL = REGISTRY.histogram("job_bias_model_seconds", "Model call start to the complete response")
+REQUEST_BYTES = REGISTRY.histogram("job_bias_model_request_bytes", "Serialized model request size", SIZE_BUCKETS)
+RESPONSE_BYTES = REGISTRY.histogram("job_bias_model_response_bytes", "Model response text size", SIZE_BUCKETS)
+REQUEST_TOKENS = REGISTRY.counter("job_bias_model_request_tokens_total",
+                                  "Prompt tokens, as reported by the model or estimated from the size")
+RESPONSE_TOKENS = REGISTRY.counter("job_bias_model_response_tokens_total",
+                                   "Response tokens, as reported by the model or estimated from the size")
+PARSE = REGISTRY.histogram("job_bias_parse_seconds", "Parsing model responses into analyses")
+REPORT_RENDER = REGISTRY.histogram("job_bias_report_render_seconds", "Rendering text reports")
+FEEDBACK_WRITE = REGISTRY.histogram("job_bias_feedback_write_seconds", "Writing buffered feedback rows to SQLite")
+FEEDBACK_ROWS = REGISTRY.counter("job_bias_feedback_rows_total", "Feedback rows written")
+
+
+class TraceLog:
+    def __init__(self, path: str):
+        """Append-only JSONL file with one record per instrumented step."""
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_trace_log: Optional[TraceLog] = None
+_trace_id: ContextVar[Optional[str]] = ContextVar("job_bias_trace_id", default=None)
+_spans: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("job_bias_spans", default=None)
+
+
+def enable_trace(path: str) -> None:
+    """Trace every instrumented step to a JSONL file."""
+    global _trace_log
+    disable_trace()
+    _trace_log = TraceLog(path)
+
+
+def disable_trace() -> None:
+    global _trace_log
+    if _trace_log is not None:
+        _trace_log.close()
+        _trace_log = None
+
+
+if os.environ.get(TRACE_ENV_VAR):
+    enable_trace(os.environ[TRACE_ENV_VAR])
+
+
+@contextmanager
+def request_trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Tag the steps run inside with a trace ID; nested calls keep the outer ID.
+
+    The ID is a context variable, so it follows the work into tasks and
+    asyncio.to_thread workers started inside.
+    """
+    current = _trace_id.get()
+    if current is not None and trace_id is None:
+        yield current
+        return
+    token = _trace_id.set(trace_id or uuid.uuid4().hex[:12])
+    try:
+        yield _trace_id.get()
+    finally:
+        try:
+            _trace_id.reset(token)
+        except ValueError:
+            # An abandoned async generator is closed from another context; that context never had the ID
+            pass
+
+
+@contextmanager
+def capture_spans() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the steps recorded inside, e.g. to show where one analysis spent its time."""
+    spans: List[Dict[str, Any]] = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+def record_span(event: str, seconds: Optional[float] = None, **fields) -> None:
+    """Send a step to the span collector and the trace log, if either is active."""
+    spans = _spans.get()
+    if spans is None and _trace_log is None:
+        return
+    record = {"event": event, **fields}
+    if seconds is not None:
+        record["seconds"] = round(seconds, 6)
+    if spans is not None:
+        spans.append(record)
+    if _trace_log is not None:
+        _trace_log.write({"ts": time.time(), "trace_id": _trace_id.get(), **record})
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """Observe the seconds spent inside in histogram (and trace them), even when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        histogram.observe(seconds, **labels)
+        record_span(histogram.name, seconds, **labels)
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> str:
+    """One line of total seconds per step, e.g. for a debug log."""
+    totals: Dict[str, List[float]] = {}
+    for span in spans:
+        if "seconds" in span:
+            name = span["event"].replace("job_bias_", "").replace("_seconds", "")
+            count_and_total = totals.setdefault(name, [0, 0.0])
+            count_and_total[0] += 1
+            count_and_total[1] += span["seconds"]
+    return ", ".join(f"{name} {total * 1000:.1f}ms" + (f" (x{count})" if count > 1 else "")
+                     for name, (count, total) in totals.items())
@@ -1,40 +1,35 @@
 import json
 import asyncio
-import sqlite3
-from pathlib import Path
-import sys
 import traceback
 from datetime import datetime
 import textwrap
-from typing import Optional, Dict, Any
+from typing import Dict, Any, Tuple
 import os
+from analysis_cache import AnalysisCache
+from feedback_store import get_feedback_store
+from instrumentation import capture_spans, record_span, summarize_spans
+from response_parser import AnalysisParseError, parse_analysis
 
 class JobBiasAnalyzerCLI:
-    def __init__(self):
-        """Initialize the CLI analyzer with database connection and debug settings"""
+    def __init__(self, backend=None):
+        """Initialize the CLI analyzer with database connection and debug settings
+
+        Args:
+            backend: Optional ModelBackend for the detector; by default it is
+                chosen from $JOB_BIAS_BACKEND (Gemini when unset).
+        """
+        self.backend = backend
         self.debug_enabled = False
         self.current_analysis = None
+        self.cache = AnalysisCache()
+        self.detector = None  # Created on first analysis and reused for the session
         self._init_database()
         self.clear_screen()
         
     def _init_database(self):
-        """Initialize SQLite database for feedback storage"""
+        """Open the shared feedback store (WAL mode, buffered batch writes)"""
         try:
-            db_path = Path("feedback.db")
-            self.conn = sqlite3.connect(str(db_path))
-            self.cursor = self.conn.cursor()
-            
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS feedback (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    term TEXT,
-                    original_suggestion TEXT,
-                    is_helpful BOOLEAN,
-                    timestamp DATETIME,
-                    context TEXT
-                )
-            """)
-            self.conn.commit()
+            self.feedback = get_feedback_store()
             self.log_debug("Database initialized successfully")
         except Exception as e:
             self.log_debug(f"Database initialization error: {str(e)}", "ERROR")
@@ -51,72 +46,98 @@ class JobBiasAnalyzerCLI:
         print("=" * 60)
         print()
 
-    def log_debug(self, message: str, level: str = "INFO") -> None:
-        """Log debug messages if debug mode is enabled"""
+    def log_debug(self, message: str, level: str = "INFO", **fields) -> None:
+        """Print a debug message and its key=value fields if debug mode is enabled; always sent to the trace log"""
+        record_span("log", level=level, message=message, **fields)
         if self.debug_enabled:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            print(f"\n[{timestamp}] [{level}] {message}")
+            details = "".join(f" {name}={value}" for name, value in fields.items())
+            print(f"\n[{timestamp}] [{level}] {message}{details}")
 
-    async def analyze_text(self, text: str) -> Dict[str, Any]:
-        """Analyze job description text for bias"""
-        try:
+    def get_detector(self):
+        """Return the session's detector, creating it on first use"""
+        if self.detector is None:
             # Import the detector here to handle potential import errors
-            from job_bias_detector import JobBiasDetector
-            detector = JobBiasDetector()
-            return await detector.analyze_job_description(text)
+            try:
+                from job_bias_detector import JobBiasDetector
+            except ImportError:
+                from job_bias_detector_args import JobBiasDetector
+            # Each analysis stands alone, as it did when a detector was built per analysis
+            self.detector = JobBiasDetector(backend=self.backend, cache=self.cache, history_window=0)
+            self.log_debug("Detector initialized")
+        return self.detector
+
+    async def stream_text(self, text: str) -> Tuple[Dict[str, Any], int]:
+        """Analyze text, printing dictionary matches at once and model terms as they arrive.
+
+        Returns the final analysis and how many of its terms were already printed.
+        """
+        shown = 0
+        analysis = {"error": "Analysis returned no result"}
+        try:
+            detector = self.get_detector()
+            async for kind, payload in detector.stream_analysis(text):
+                if kind == "local":
+                    if payload.flagged_terms:
+                        terms = ", ".join(dict.fromkeys(term["term"] for term in payload.flagged_terms))
+                        print(f"Dictionary matches: {terms}")
+                        print("Waiting for the model's analysis...", flush=True)
+                elif kind == "term":
+                    if not shown:
+                        print("\nFlagged Terms:")
+                    shown += 1
+                    self.print_term(payload)
+                else:
+                    analysis = payload
         except ImportError:
             self.log_debug("Failed to import JobBiasDetector", "ERROR")
-            return {"error": "Analysis module not found. Please ensure job_bias_detector.py is available."}
+            analysis = {"error": "Analysis module not found. Please ensure job_bias_detector.py is available."}
         except Exception as e:
             self.log_debug(f"Analysis error: {str(e)}", "ERROR")
-            return {"error": f"Analysis failed: {str(e)}"}
-
-    def display_results(self, analysis: Dict[str, Any]) -> None:
-        """Display analysis results in a formatted way"""
+            analysis = {"error": f"Analysis failed: {str(e)}"}
+        return analysis, shown
+
+    def print_term(self, term: Dict[str, Any]) -> None:
+        """Print one flagged term"""
+        print("\n" + "-" * 40)
+        print(f"Term: {term.get('term', '')}")
+        print(f"Severity: {'●' * term['severity']}{'○' * (5 - term['severity'])} ({term['severity']}/5)")
+        print(f"Suggestion: {term.get('suggestion', '')}")
+        print("Explanation:")
+        # Wrap explanation text for better readability
+        explanation = term.get('explanation', '')
+        wrapped_explanation = textwrap.fill(explanation, width=60)
+        print(wrapped_explanation, flush=True)
+
+    def display_results(self, analysis: Dict[str, Any], terms_shown: int = 0) -> None:
+        """Display analysis results in a formatted way
+
+        ``terms_shown`` flagged terms were already printed while streaming and are not repeated.
+        """
         try:
-            if "error" in analysis:
-                print("\nError:", analysis["error"])
+            # No-op for results the detector already parsed
+            analysis = parse_analysis(analysis)
+            if analysis.is_error:
+                print("\nError:", analysis.error)
                 return
-            
-            # Convert JSON string to dictionary if needed
-            if isinstance(analysis, str):
-                try:
-                    # Remove any leading/trailing whitespace and handle potential empty strings
-                    analysis = analysis.strip()
-                    if not analysis:
-                        raise ValueError("Empty input string")
-                    # Try to parse the JSON string
-                    analysis = json.loads(analysis)
-                except json.JSONDecodeError as e:
-                    # If the string is not valid JSON, try to strip any potential markdown code block syntax
-                    clean_str = analysis.replace('```json', '').replace('```', '').strip()
-                    try:
-                        analysis = json.loads(clean_str)
-                    except json.JSONDecodeError:
-                        raise ValueError(f"Invalid JSON input: {str(e)}")
-                except Exception as e:
-                    raise ValueError(f"Error processing input: {str(e)}")
+
+            flagged_terms = analysis.flagged_terms
+            remaining = flagged_terms[terms_shown:]
+            if remaining:
+                if not terms_shown:
+                    print("\nFlagged Terms:")
+                for term in remaining:
+                    self.print_term(term)
 
             print("\nAnalysis Results:")
             print("-" * 40)
-            print(f"Discrimination Score: {analysis.get('discrimination_score', 0)}/10")
-            
-            flagged_terms = analysis.get('flagged_terms', [])
-            if flagged_terms:
-                print("\nFlagged Terms:")
-                for term in flagged_terms:
-                    print("\n" + "-" * 40)
-                    print(f"Term: {term.get('term', '')}")
-                    print(f"Severity: {'●' * term.get('severity', 0)}{'○' * (5 - term.get('severity', 0))} ({term.get('severity', 0)}/5)")
-                    print(f"Suggestion: {term.get('suggestion', '')}")
-                    print("Explanation:")
-                    # Wrap explanation text for better readability
-                    explanation = term.get('explanation', '')
-                    wrapped_explanation = textwrap.fill(explanation, width=60)
-                    print(wrapped_explanation)
-            else:
+            print(f"Discrimination Score: {analysis.discrimination_score}/10")
+            if not flagged_terms:
                 print("\nNo biased terms detected.")
 
+        except AnalysisParseError as e:
+            self.log_debug(f"Invalid analysis: {str(e)}", "ERROR")
+            print("\nError: the analysis could not be read.")
         except Exception as e:
             self.log_debug(f"Display error: {str(e)}", "ERROR")
             print("\nError displaying results. Check debug output for details.")
@@ -154,21 +175,13 @@ class JobBiasAnalyzerCLI:
         is_helpful = response.startswith('y')
         
         try:
-            now = datetime.now().isoformat().replace(":", ".")
-            # Store feedback for each flagged term
-            for term in self.current_analysis.get('flagged_terms', []):
-                self.cursor.execute("""
-                    INSERT INTO feedback (term, original_suggestion, is_helpful, timestamp, context)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    term.get('term', ''),
-                    term.get('suggestion', ''),
-                    is_helpful,
-                    now,
-                    json.dumps(term)
-                ))
-            
-            self.conn.commit()
+            now = datetime.now()
+            # Feedback for every flagged term is written in one transaction
+            self.feedback.add_many(
+                (term.get('term', ''), term.get('suggestion', ''), is_helpful, now, json.dumps(term))
+                for term in self.current_analysis.get('flagged_terms', [])
+            )
+            self.feedback.flush()
             print("Thank you for your feedback!")
             
         except Exception as e:
@@ -192,29 +205,13 @@ class JobBiasAnalyzerCLI:
             if choice == '1':
                 text = self.get_multiline_input()
                 if text.strip():
-                    print("\nAnalyzing...")
-                    analysis = await self.analyze_text(text)
-
-                    # Convert JSON string to dictionary if needed
-                    if isinstance(analysis, str):
-                        try:
-                            # Remove any leading/trailing whitespace and handle potential empty strings
-                            analysis = analysis.strip()
-                            if not analysis:
-                                raise ValueError("Empty input string")
-                            # Try to parse the JSON string
-                            self.current_analysis = json.loads(analysis)
-                        except json.JSONDecodeError as e:
-                            # If the string is not valid JSON, try to strip any potential markdown code block syntax
-                            clean_str = analysis.replace('```json', '').replace('```', '').strip()
-                            try:
-                                self.current_analysis = json.loads(clean_str)
-                            except json.JSONDecodeError:
-                                raise ValueError(f"Invalid JSON input: {str(e)}")
-                        except Exception as e:
-                            raise ValueError(f"Error processing input: {str(e)}")
-
-                    self.display_results(self.current_analysis)
+                    print("\nAnalyzing...", flush=True)
+                    # Terms are printed as they stream in; the rest of the result follows
+                    with capture_spans() as spans:
+                        self.current_analysis, shown = await self.stream_text(text)
+                    self.log_debug("Analysis timings", chars=len(text), steps=summarize_spans(spans) or "none")
+
+                    self.display_results(self.current_analysis, terms_shown=shown)
                     self.get_feedback()
                     input("\nPress Enter to continue...")
                     
@@ -247,7 +244,7 @@ def main():
         traceback.print_exc()
     finally:
         try:
-            analyzer.conn.close()
+            analyzer.feedback.close()
         except:
             pass
 
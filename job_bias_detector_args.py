@@ -1,19 +1,66 @@
-import google.generativeai as genai
-from load_creds import load_creds
+from bias_matcher import BiasMatcher
+from analysis_cache import AnalysisCache, make_cache_key
+from response_parser import (AnalysisParseError, AnalysisResult, StreamingTermParser, parse_analysis,
+                             parse_analysis_batch)
+from micro_batch import DEFAULT_TOKEN_BUDGET, plan_micro_batches
+from text_chunking import DEFAULT_CHUNK_CHARS, chunk_description, merge_chunk_analyses
+from rate_limit import DEFAULT_MAX_MODEL_CALLS, ResilientModel
+from instrumentation import PARSE, PROMPT_BUILD, REGISTRY, enable_trace, request_trace, timed
+from model_backends import BACKEND_ENV_VAR, BACKENDS, ModelBackend, create_backend
+import hashlib
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Iterable, AsyncIterator, Tuple
 import os
 from pathlib import Path
 import asyncio
 import argparse
+import itertools
+from job_ingest import FORMATS, iter_records
+from batch_journal import BatchJournal, record_id
+from analysis_export import EXPORT_FORMATS, AnalysisExporter
+from report_writer import OUTPUT_FORMATS, ReportWriter, render_report
 
 class JobBiasDetector:
-    def __init__(self):
-        """Initialize the bias detector with Google API key."""
-        creds = load_creds()
-        genai.configure(credentials=creds)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+    PRESCREEN_MODES = ("off", "skip-clean", "offline")
+
+    def __init__(self, backend: Optional[ModelBackend] = None, history_window: Optional[int] = None, prescreen: str = "off",
+                 cache: Optional[AnalysisCache] = None, requests_per_second: Optional[float] = None,
+                 max_retries: int = 3, request_timeout: Optional[float] = None,
+                 chunk_chars: Optional[int] = DEFAULT_CHUNK_CHARS, max_concurrency: Optional[int] = None):
+        """Initialize the bias detector with Google API key.
+
+        Args:
+            backend: ModelBackend that builds the model, e.g. a FakeBackend for
+                offline runs. Defaults to create_backend(), i.e. Gemini unless
+                $JOB_BIAS_BACKEND says otherwise.
+            history_window: Number of previous analysis exchanges resent with
+                each request. ``None`` keeps the whole conversation, ``0`` sends
+                every description on its own.
+            prescreen: How the local bias_dict matcher is used. ``"off"``
+                always asks the model, ``"skip-clean"`` answers locally when no
+                dictionary term occurs, ``"offline"`` never calls the model.
+            cache: Optional AnalysisCache consulted before calling the model.
+            requests_per_second: Client-side rate limit for model calls, or None.
+            max_retries: Retries for throttled, timed out or transient calls.
+            request_timeout: Seconds before a model call counts as timed out, or None.
+            chunk_chars: Descriptions longer than this many characters are split
+                at sentence boundaries and the chunks analyzed concurrently.
+                ``None`` or ``0`` always sends the whole description.
+            max_concurrency: Descriptions the caller analyzes at once (e.g.
+                ``-c``). Model calls in flight, and the threads running them,
+                are capped at this or DEFAULT_MAX_MODEL_CALLS, whichever is
+                larger, since a chunked description makes several calls.
+        """
+        if prescreen not in self.PRESCREEN_MODES:
+            raise ValueError(f"Unknown prescreen mode: {prescreen}")
+        self.model_name = 'gemini-1.5-pro'
         self.messages = []  # Store conversation history
+        self.history_window = history_window
+        self.prescreen = prescreen
+        self.cache = cache
+        self.chunk_chars = chunk_chars
+        self.model_calls = 0  # Number of generate_content requests made
+        self.batch_stats = {"packed_requests": 0, "packed_items": 0, "fallbacks": 0}
         # Enhanced dictionary of biased terms with multiple discrimination categories
         self.bias_dict = {
             "young": {
@@ -42,6 +89,29 @@ class JobBiasDetector:
                 "explanation": "May discriminate against caregivers and promote unhealthy work-life balance"
             }
         }
+
+        self.backend = backend if backend is not None else create_backend()
+        # Every model call goes through the client for rate limiting and retries
+        self.client = ResilientModel(None, requests_per_second=requests_per_second,
+                                     max_retries=max_retries, timeout=request_timeout,
+                                     max_concurrency=max(max_concurrency or 0, DEFAULT_MAX_MODEL_CALLS))
+        self._bias_fingerprint = None
+        self._sync_bias_rules()
+
+    def bias_fingerprint(self) -> str:
+        """Hash of bias_dict; changes whenever a term, category or replacement is edited."""
+        return hashlib.sha256(json.dumps(self.bias_dict, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _sync_bias_rules(self) -> str:
+        """Rebuild the matcher and model when bias_dict has changed since they were built."""
+        fingerprint = self.bias_fingerprint()
+        if fingerprint != self._bias_fingerprint:
+            self.matcher = BiasMatcher(self.bias_dict)
+            # The bias rules travel as a system instruction, so no priming round-trip is needed
+            self.model = self.backend.create_model(self.model_name, self._create_initial_prompt(), self.bias_dict)
+            self.client.model = self.model
+            self._bias_fingerprint = fingerprint
+        return fingerprint
     
     def _create_initial_prompt(self) -> str:
         """Create the initial system prompt explaining the task."""
@@ -94,126 +164,347 @@ class JobBiasDetector:
             "improved_description": "rewritten job description removing all biased language"
         }}"""
 
-    def _create_analysis_prompt(self, job_description: str) -> str:
-        """Create the prompt for analyzing a specific job description."""
+    def _create_batch_prompt(self, items: List[Tuple[str, str]]) -> str:
+        """Create one prompt asking for analyses of several job descriptions, keyed by item ID."""
+        sections = "\n\n".join(
+            f"<<<ITEM {item_id}>>>\n{description}\n<<<END ITEM {item_id}>>>" for item_id, description in items
+        )
+        return f"""Analyze each of the following job descriptions for discriminatory language, considering all previous guidelines.
+        Analyze every item independently; do not let one item influence another.
+
+        {sections}
+
+        Respond with a JSON array containing exactly one object per item, in this form:
+        [{{"id": "item ID from the markers", "analysis": {{ ...analysis in the specified JSON format... }}}}]"""
+
+    def _create_analysis_prompt(self, job_description: str, context: str = "") -> str:
+        """Create the prompt for analyzing a specific job description.
+
+        ``context`` is text preceding a chunk of a longer description; the
+        model may read it but should only analyze and rewrite the chunk.
+        """
+        context_section = ""
+        if context:
+            context_section = f"""Preceding text, for context only (do not analyze or rewrite it):
+        {context}
+
+        """
         return f"""Analyze this job description for discriminatory language, considering all previous guidelines:
 
-        Job Description:
+        {context_section}Job Description:
         {job_description}
 
         Provide your analysis in the specified JSON format."""
 
-    async def analyze_job_description(self, job_description: str) -> Dict[str, Any]:
-        """Analyze a job description for bias and discrimination using conversation history."""
-        try:
-            # Start new conversation if this is the first analysis
-            if not self.messages:
-                initial_prompt = self._create_initial_prompt()
-                self.messages = [
-                    {'role': 'user', 'parts': [initial_prompt]}
-                ]
-                response = self.model.generate_content(self.messages)
-                self.messages.append(response.candidates[0].content)
-
-            # Add the job description analysis request
-            analysis_prompt = self._create_analysis_prompt(job_description)
-            self.messages.append({'role': 'user', 'parts': [analysis_prompt]})
-            
-            # Get the analysis
-            response = self.model.generate_content(self.messages)
-            
-            # Add the response to conversation history
-            self.messages.append(response.candidates[0].content)
-            
-            # Parse and return the analysis
-            return response.text
-            
-        except Exception as e:
-            return {
-                "error": f"Analysis failed: {str(e)}",
-                "flagged_terms": [],
-                "discrimination_score": 0,
-                "confidence_level": 0,
-                "discrimination_categories": {
-                    "age_discrimination": {"count": 0, "severity": 0, "terms": []},
-                    "unprofessional_language": {"count": 0, "severity": 0, "terms": []},
-                    "work_life_balance": {"count": 0, "severity": 0, "terms": []},
-                    "aggressive_language": {"count": 0, "severity": 0, "terms": []}
-                },
-                "compounding_effects_summary": "Analysis failed",
-                "overall_risk_assessment": "Analysis failed",
-                "improved_description": job_description
-            }
+    async def analyze_job_description(self, job_description: str, keep_history: bool = True,
+                                      context: str = "") -> AnalysisResult:
+        """Analyze a job description for bias and discrimination using conversation history.
 
-    async def analyze_multiple_descriptions(self, descriptions: List[str]) -> List[Dict[str, Any]]:
-        """Analyze multiple job descriptions while maintaining conversation context."""
-        results = []
-        for description in descriptions:
-            analysis = await self.analyze_job_description(description)
-            results.append(analysis)
-        return results
+        The blocking model call runs in a worker thread, behind the rate
+        limiter and retry policy, so that several analyses can be in flight
+        on the same event loop. With ``keep_history=False`` the exchange is
+        not appended to the conversation, which is what concurrent batches
+        use. The response is parsed exactly once here; callers receive an
+        AnalysisResult. Descriptions longer than ``chunk_chars`` are analyzed
+        in chunks (see _analyze_chunked).
+        """
+        with request_trace():
+            try:
+                fingerprint = self._sync_bias_rules()
+                answer, cache_key = self._precomputed_analysis(job_description, fingerprint, context)
+                if answer is not None:
+                    return answer
 
-    def generate_report(self, analysis: Dict[str, Any], output_file: str = None) -> str:
-        """Generate an enhanced report highlighting multiple discrimination types."""
-        # Convert JSON string to dictionary if needed
-        if isinstance(analysis, str):
+                if self._needs_chunking(job_description):
+                    analysis = await self._analyze_chunked(job_description)
+                    if cache_key is not None and not analysis.is_error:
+                        self.cache.set(cache_key, analysis)
+                    return analysis
+
+                # Add the job description analysis request
+                with timed(PROMPT_BUILD, kind="single"):
+                    analysis_prompt = self._create_analysis_prompt(job_description, context)
+                request = {'role': 'user', 'parts': [analysis_prompt]}
+
+                # Get the analysis
+                # May refresh credentials over the network, so it runs off the event loop
+                await asyncio.to_thread(self.backend.before_request)
+                self.model_calls += 1
+                response = await self.client.generate_content_async(self.messages + [request])
+
+                # Add the exchange to conversation history
+                if keep_history:
+                    self._remember(request, response.candidates[0].content)
+
+                # Parse and return the analysis
+                try:
+                    with timed(PARSE, kind="single"):
+                        analysis = parse_analysis(response.text)
+                except AnalysisParseError as e:
+                    failed = self._failed_analysis(job_description, f"Analysis failed: {str(e)}")
+                    failed["raw_response"] = response.text
+                    return failed
+
+                if cache_key is not None:
+                    self.cache.set(cache_key, analysis)
+                return analysis
+
+            except Exception as e:
+                return self._failed_analysis(job_description, f"Analysis failed: {str(e)}")
+
+    async def stream_analysis(self, job_description: str, keep_history: bool = True,
+                              context: str = "") -> AsyncIterator[Tuple[str, Any]]:
+        """Analyze a job description, yielding ``(kind, payload)`` events as results become available.
+
+        ``("local", analysis)`` comes first: the bias_dict matcher's result,
+        available before the model is asked. ``("term", flagged_term)``
+        follows for each flagged term as soon as its JSON object has
+        streamed in, and ``("result", analysis)`` ends the stream with the
+        complete AnalysisResult (an error result if the analysis failed).
+        Answers from the cache or the prescreen, and chunked descriptions,
+        have no term events; their terms are in the result.
+        """
+        with request_trace():
             try:
-                # Remove any leading/trailing whitespace and handle potential empty strings
-                analysis = analysis.strip()
-                if not analysis:
-                    raise ValueError("Empty input string")
-                # Try to parse the JSON string
-                analysis = json.loads(analysis)
-            except json.JSONDecodeError as e:
-                # If the string is not valid JSON, try to strip any potential markdown code block syntax
-                clean_str = analysis.replace('```json', '').replace('```', '').strip()
+                fingerprint = self._sync_bias_rules()
+                yield "local", parse_analysis(self.matcher.analyze(job_description))
+
+                answer, cache_key = self._precomputed_analysis(job_description, fingerprint, context)
+                if answer is None and self._needs_chunking(job_description):
+                    answer = await self._analyze_chunked(job_description)
+                    if cache_key is not None and not answer.is_error:
+                        self.cache.set(cache_key, answer)
+                if answer is not None:
+                    yield "result", answer
+                    return
+
+                with timed(PROMPT_BUILD, kind="single"):
+                    request = {'role': 'user', 'parts': [self._create_analysis_prompt(job_description, context)]}
+                # May refresh credentials over the network, so it runs off the event loop
+                await asyncio.to_thread(self.backend.before_request)
+                self.model_calls += 1
+                parser = StreamingTermParser()
+                async for text in self.client.stream_content_async(self.messages + [request]):
+                    for term in parser.feed(text):
+                        yield "term", term
+
+                if keep_history:
+                    self._remember(request, {'role': 'model', 'parts': [parser.buffer]})
                 try:
-                    analysis = json.loads(clean_str)
-                except json.JSONDecodeError:
-                    raise ValueError(f"Invalid JSON input: {str(e)}")
+                    with timed(PARSE, kind="stream"):
+                        analysis = parse_analysis(parser.buffer)
+                except AnalysisParseError as e:
+                    failed = self._failed_analysis(job_description, f"Analysis failed: {str(e)}")
+                    failed["raw_response"] = parser.buffer
+                    yield "result", failed
+                    return
+
+                if cache_key is not None:
+                    self.cache.set(cache_key, analysis)
+                yield "result", analysis
+
             except Exception as e:
-                raise ValueError(f"Error processing input: {str(e)}")
+                yield "result", self._failed_analysis(job_description, f"Analysis failed: {str(e)}")
 
-        report = f"""Job Description Bias Analysis Report
-                {'='*80}
+    def _precomputed_analysis(self, job_description: str, fingerprint: str,
+                              context: str = "") -> Tuple[Optional[AnalysisResult], Optional[str]]:
+        """Answer from the local dictionary or the cache when the model is not needed.
 
-                OVERALL METRICS
-                {'-'*40}
-                Discrimination Score: {analysis.get('discrimination_score')}/10
-                Confidence Level: {analysis.get('confidence_level')*100:.1f}%
+        Returns the analysis (or None) and the cache key to store a fresh
+        model answer under (or None when caching is off). A chunk is cached
+        together with its context, since the context can change the answer.
+        """
+        if self.prescreen != "off":
+            local_analysis = self.matcher.analyze(job_description)
+            if self.prescreen == "offline" or not local_analysis["flagged_terms"]:
+                return parse_analysis(local_analysis), None
 
-                DISCRIMINATION CATEGORIES ANALYSIS
-                {'-'*40}"""
+        cache_key = None
+        if self.cache is not None:
+            # Results from different backends must never be mixed up
+            cache_text = f"{context}\n\n{job_description}" if context else job_description
+            cache_key = make_cache_key(cache_text, fingerprint, f"{self.backend.name}:{self.model_name}")
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return parse_analysis(cached), cache_key
+        return None, cache_key
 
-        for category, details in analysis.get('discrimination_categories', {}).items():
-            report += f"\n\n{category.replace('_', ' ').title()}:"
-            report += f"\n  Instances: {details['count']}"
-            report += f"\n  Average Severity: {details['severity']}/5"
-            report += f"\n  Problematic Terms: {', '.join(details['terms'])}"
+    def _needs_chunking(self, job_description: str) -> bool:
+        return bool(self.chunk_chars) and len(job_description) > self.chunk_chars
 
-        report += f"\n\nDETAILED TERM ANALYSIS"
-        report += f"\n{'-'*40}"
+    async def _analyze_chunked(self, job_description: str) -> AnalysisResult:
+        """Analyze a long description as concurrent chunk requests and merge the results.
 
-        for term in analysis.get('flagged_terms', []):
-            report += f"\n\nFlagged Term: {term['term']}"
-            report += f"\nCategories: {', '.join(term['categories'])}"
-            report += f"\nContext: \"{term['context']}\""
-            report += f"\nSeverity: {term['severity']}/5"
-            report += f"\nExplanation: {term['explanation']}"
-            report += f"\nCompounding Effects: {term['compounding_effects']}"
-            report += f"\nSuggested Replacement: {term['suggestion']}"
+        Latency follows the slowest chunk rather than the total length, and
+        each chunk is cached on its own, so rerunning after one chunk failed
+        only resends that chunk.
+        """
+        chunks = chunk_description(job_description, self.chunk_chars)
+        analyses = await asyncio.gather(*(
+            self.analyze_job_description(chunk["text"], keep_history=False, context=chunk["context"])
+            for chunk in chunks
+        ))
+        failed = next((analysis for analysis in analyses if analysis.is_error), None)
+        if failed is not None:
+            return self._failed_analysis(job_description, failed.error)
+        return merge_chunk_analyses(chunks, analyses)
 
-        report += f"\n\nCOMPOUNDING EFFECTS SUMMARY"
-        report += f"\n{'-'*40}"
-        report += f"\n{analysis.get('compounding_effects_summary')}"
+    async def analyze_packed(self, descriptions: List[str]) -> List[AnalysisResult]:
+        """Analyze several descriptions with a single model request.
 
-        report += f"\n\nRISK ASSESSMENT"
-        report += f"\n{'-'*40}"
-        report += f"\n{analysis.get('overall_risk_assessment')}"
+        Descriptions answered by the dictionary or the cache are left out of
+        the request. The model is asked for a JSON array keyed by item ID;
+        only the items missing or invalid in that answer fall back to their
+        own single-description request. Descriptions long enough to be
+        chunked are never packed. Results are in input order.
+        """
+        results: List[Optional[AnalysisResult]] = [None] * len(descriptions)
+        packed = 0
+        try:
+            fingerprint = self._sync_bias_rules()
+            to_send = []
+            for position, description in enumerate(descriptions):
+                answer, cache_key = self._precomputed_analysis(description, fingerprint)
+                if answer is not None:
+                    results[position] = answer
+                elif not self._needs_chunking(description):
+                    to_send.append((f"item-{position}", position, description, cache_key))
+
+            if len(to_send) > 1:
+                with timed(PROMPT_BUILD, kind="packed"):
+                    prompt = self._create_batch_prompt([(item_id, description)
+                                                        for item_id, _, description, _ in to_send])
+                # May refresh credentials over the network, so it runs off the event loop
+                await asyncio.to_thread(self.backend.before_request)
+                self.model_calls += 1
+                self.batch_stats["packed_requests"] += 1
+                self.batch_stats["packed_items"] += len(to_send)
+                packed = len(to_send)
+                response = await self.client.generate_content_async([{'role': 'user', 'parts': [prompt]}])
+                with timed(PARSE, kind="packed"):
+                    analyses = parse_analysis_batch(response.text)
+                for item_id, position, description, cache_key in to_send:
+                    analysis = analyses.get(item_id)
+                    if analysis is not None and not analysis.is_error:
+                        results[position] = analysis
+                        if cache_key is not None:
+                            self.cache.set(cache_key, analysis)
+        except Exception:
+            # Nothing usable came back; every unanswered item falls back below
+            pass
+
+        missing = [position for position, result in enumerate(results) if result is None]
+        if packed:
+            self.batch_stats["fallbacks"] += packed - sum(
+                results[position] is not None for _, position, _, _ in to_send)
+        singles = await asyncio.gather(*(
+            self.analyze_job_description(descriptions[position], keep_history=False) for position in missing
+        ))
+        for position, analysis in zip(missing, singles):
+            results[position] = analysis
+        return results
+
+    def _remember(self, request: Dict[str, Any], content: Any) -> None:
+        """Append an exchange to the conversation history and apply the history window."""
+        self.messages.extend([request, content])
+        self._trim_history()
+
+    def _trim_history(self) -> None:
+        """Drop analysis exchanges that fall outside the history window."""
+        if self.history_window is None:
+            return
+        keep = 2 * max(self.history_window, 0)
+        if len(self.messages) > keep:
+            self.messages = self.messages[-keep:] if keep else []
+
+    def _failed_analysis(self, job_description: str, error: str) -> AnalysisResult:
+        """Build the zeroed result returned when an analysis cannot be completed."""
+        return AnalysisResult({
+            "error": error,
+            "flagged_terms": [],
+            "discrimination_score": 0,
+            "confidence_level": 0,
+            "discrimination_categories": {
+                "age_discrimination": {"count": 0, "severity": 0, "terms": []},
+                "unprofessional_language": {"count": 0, "severity": 0, "terms": []},
+                "work_life_balance": {"count": 0, "severity": 0, "terms": []},
+                "aggressive_language": {"count": 0, "severity": 0, "terms": []}
+            },
+            "compounding_effects_summary": "Analysis failed",
+            "overall_risk_assessment": "Analysis failed",
+            "improved_description": job_description
+        })
+
+    async def analyze_stream(self, descriptions: Iterable[str], max_concurrency: int = 1,
+                             token_budget: Optional[int] = None) -> AsyncIterator[Tuple[int, Any]]:
+        """Yield ``(index, analysis)`` pairs as analyses complete.
+
+        Descriptions are pulled from the iterable only when a slot frees up,
+        so at most ``max_concurrency`` requests are held or in flight at any
+        time and arbitrarily long inputs run in constant memory. With
+        ``max_concurrency=1`` results arrive in input order and keep the
+        conversation context; otherwise each request is sent on its own and
+        results arrive in completion order. With a ``token_budget``
+        consecutive descriptions are packed into as few requests as the
+        budget allows (see analyze_packed). A failing description yields the
+        usual error dict instead of aborting the stream.
+        """
+        limit = max(max_concurrency, 1)
+        keep_history = limit == 1 and not token_budget
+
+        if token_budget:
+            units = plan_micro_batches(enumerate(descriptions), token_budget)
+        else:
+            units = ([item] for item in enumerate(descriptions))
+
+        async def run(unit: List[Tuple[int, str]]) -> List[Tuple[int, Any]]:
+            try:
+                if len(unit) == 1:
+                    index, description = unit[0]
+                    return [(index, await self.analyze_job_description(description, keep_history=keep_history))]
+                analyses = await self.analyze_packed([description for _, description in unit])
+                return [(index, analysis) for (index, _), analysis in zip(unit, analyses)]
+            except Exception as e:
+                return [(index, self._failed_analysis(description, f"Analysis failed: {str(e)}"))
+                        for index, description in unit]
+
+        pending = set()
+        for unit in units:
+            pending.add(asyncio.ensure_future(run(unit)))
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in task.result():
+                        yield result
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for result in task.result():
+                    yield result
+
+    async def analyze_multiple_descriptions(self, descriptions: List[str], max_concurrency: int = 1,
+                                            token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Analyze multiple job descriptions, optionally with several requests in flight.
+
+        With ``max_concurrency=1`` descriptions are analyzed one after another
+        while maintaining conversation context; higher values keep that many
+        requests in flight, and a ``token_budget`` packs several descriptions
+        into each request. Results are returned in input order.
+        """
+        results: List[Any] = [None] * len(descriptions)
+        async for index, analysis in self.analyze_stream(descriptions, max_concurrency, token_budget):
+            results[index] = analysis
+        return results
+
+    def generate_report(self, analysis: Dict[str, Any], output_file: str = None) -> str:
+        """Generate an enhanced report highlighting multiple discrimination types."""
+        # Accepts raw response text too; already parsed results are not parsed again
+        try:
+            analysis = parse_analysis(analysis)
+        except AnalysisParseError as e:
+            raise ValueError(f"Invalid JSON input: {str(e)}")
 
-        report += f"\n\nIMPROVED JOB DESCRIPTION"
-        report += f"\n{'-'*40}"
-        report += f"\n{analysis.get('improved_description')}"
+        report = render_report(analysis)
 
         if output_file:
             with open(output_file, 'w') as f:
@@ -235,60 +526,206 @@ Examples:
     python script.py "Job description 1" "Job description 2"
     python script.py -f job_descriptions.txt
     python script.py -o custom_output_dir "Job description 1"
+    python script.py -c 8 -f job_descriptions.txt
+    python script.py --format blocks -f postings.txt
+    python script.py -f postings.jsonl
+    python script.py --resume -f postings.jsonl
+    python script.py --pack -c 4 -f job_descriptions.txt
+    python script.py --chunk-chars 3000 -f long_postings.jsonl
+    python script.py --output-format jsonl -c 8 -f postings.jsonl
+    python script.py --export corpus.db -c 8 -f postings.jsonl
         """)
     
     # Add arguments
     parser.add_argument('descriptions', nargs='*', help='Job descriptions to analyze (as quoted strings)')
-    parser.add_argument('-f', '--file', type=str, help='File containing job descriptions (one per line)')
+    parser.add_argument('-f', '--file', type=str,
+                       help='File containing job descriptions (one per line unless --format says otherwise)')
+    parser.add_argument('--format', choices=FORMATS, default='auto',
+                       help='Input file format: lines, blank-line separated blocks, jsonl or csv '
+                            '(default: auto, from the file extension)')
     parser.add_argument('-o', '--output-dir', type=str, default='bias_analysis_reports',
                        help='Directory to store analysis reports (default: bias_analysis_reports)')
+    parser.add_argument('--history-window', type=int, default=None,
+                       help='Previous analyses resent with each request; 0 makes every request stateless (default: keep all)')
+    parser.add_argument('--prescreen', choices=JobBiasDetector.PRESCREEN_MODES, default='off',
+                       help='Use the local bias dictionary to skip the model for clean text (skip-clean) '
+                            'or to answer without the model (offline) (default: off)')
+    parser.add_argument('--cache-db', type=str, default='analysis_cache.db',
+                       help='SQLite file caching analyses across runs (default: analysis_cache.db)')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the model, ignoring cached analyses')
+    parser.add_argument('--journal', type=str, default=None,
+                       help='Checkpoint file recording finished items (default: OUTPUT_DIR/batch_journal.jsonl)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip descriptions already recorded in the journal by a previous run')
+    parser.add_argument('--rps', type=float, default=None,
+                       help='Maximum model requests per second (default: unlimited)')
+    parser.add_argument('--max-retries', type=int, default=3,
+                       help='Retries for throttled or transient model errors (default: 3)')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                       help='Model backend; "fake" runs offline with deterministic answers '
+                            '(default: $JOB_BIAS_BACKEND or gemini)')
+    parser.add_argument('--fake-latency', type=float, default=0.0,
+                       help='Seconds each fake backend call takes (default: 0)')
+    parser.add_argument('--fake-error-rate', type=float, default=0.0,
+                       help='Fraction of fake backend calls that fail with a transient error (default: 0)')
+    parser.add_argument('--pack', type=int, nargs='?', const=DEFAULT_TOKEN_BUDGET, default=None,
+                       metavar='TOKEN_BUDGET',
+                       help='Pack several descriptions into each model request, sized to fit TOKEN_BUDGET '
+                            f'tokens (default budget when given without a value: {DEFAULT_TOKEN_BUDGET})')
+    parser.add_argument('--chunk-chars', type=int, default=DEFAULT_CHUNK_CHARS,
+                       help='Split descriptions longer than this many characters into chunks analyzed '
+                            f'concurrently; 0 disables chunking (default: {DEFAULT_CHUNK_CHARS})')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='txt',
+                       help='One report file per description (txt), or every analysis in a single '
+                            'analyses.jsonl or analyses.parquet (needs pyarrow) (default: txt)')
+    parser.add_argument('--writers', type=int, default=4,
+                       help='Threads writing txt reports (default: 4)')
+    parser.add_argument('--export', type=str, default=None, metavar='PATH',
+                       help='Also export scores, category counts and flagged terms as flat tables to PATH')
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default='sqlite',
+                       help='SQLite database file, or directory of Parquet files (needs pyarrow) (default: sqlite)')
+    parser.add_argument('--trace', type=str, default=None, metavar='FILE',
+                       help='Append a JSONL record of every pipeline step (prompt, model call, parse, '
+                            'render) to FILE')
+    parser.add_argument('--metrics', type=str, default=None, metavar='FILE',
+                       help='Write step timings, sizes and token counts in Prometheus text format to FILE '
+                            'at the end of the run')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                       help='Maximum number of descriptions analyzed at the same time (default: 1)')
     
     # Parse arguments
     args = parser.parse_args()
+    if args.trace:
+        enable_trace(args.trace)
     
-    # Get job descriptions from either command line arguments or file
-    job_descriptions: List[str] = []
-    
+    # Stream job descriptions from the file, followed by any command line arguments
+    records = iter(())
     if args.file:
         try:
-            with open(args.file, 'r', encoding='utf-8') as f:
-                job_descriptions.extend(line.strip() for line in f if line.strip())
+            open(args.file, 'r', encoding='utf-8').close()
         except Exception as e:
             print(f"Error reading file {args.file}: {str(e)}")
             return
-    
-    # Add descriptions from command line arguments
-    if args.descriptions:
-        job_descriptions.extend(args.descriptions)
+        records = iter_records(args.file, args.format)
+    records = itertools.chain(records, ({"description": d} for d in args.descriptions))
     
     # Check if we have any descriptions to analyze
-    if not job_descriptions:
+    try:
+        first_record = next(records)
+    except StopIteration:
+        first_record = None
+    except Exception as e:
+        print(f"Error reading file {args.file}: {str(e)}")
+        return
+    if first_record is None:
         parser.print_help()
         print("\nError: No job descriptions provided. Please provide descriptions either as arguments or through a file.")
         return
     
     # Initialize the detector
-    detector = JobBiasDetector()
+    cache = None if args.no_cache else AnalysisCache(args.cache_db)
+    backend_options = {}
+    if (args.backend or os.environ.get(BACKEND_ENV_VAR)) == "fake":
+        backend_options = {"latency": args.fake_latency, "error_rate": args.fake_error_rate}
+    detector = JobBiasDetector(backend=create_backend(args.backend, **backend_options),
+                               history_window=args.history_window, prescreen=args.prescreen, cache=cache,
+                               requests_per_second=args.rps, max_retries=args.max_retries,
+                               chunk_chars=args.chunk_chars, max_concurrency=args.concurrency)
     
     # Create output directory if it doesn't exist
     output_dir = Path(args.output_dir)
     output_dir.mkdir(exist_ok=True)
     
-    # Analyze all descriptions
+    # Finished items are journaled so an interrupted run can be resumed
+    journal = BatchJournal(args.journal or output_dir / "batch_journal.jsonl", resume=args.resume)
     try:
-        analyses = await detector.analyze_multiple_descriptions(job_descriptions)
-        
-        # Generate reports for each analysis
-        for i, analysis in enumerate(analyses, 1):
-            output_file = output_dir / f"job_analysis_report_{i}.txt"
-            report = detector.generate_report(analysis, str(output_file))
-            print(f"\nAnalysis Report {i}:")
-            print(report)
-            print("\n" + "="*80 + "\n")
+        exporter = AnalysisExporter(args.export, args.export_format) if args.export else None
+        writer = ReportWriter(output_dir, args.output_format, max_workers=args.writers, append=args.resume)
+    except RuntimeError as e:
+        print(f"Error: {str(e)}")
+        journal.close()
+        return
+    item_ids = {}  # analyze_stream index -> item ID, for items still in flight
+    analyses = {}  # item ID -> (description, analysis), until its report is written
+    skipped = 0
+    failed = 0
+
+    queued_ids = set()  # Item IDs queued in this run; a repeated description is analyzed once
+    duplicates = 0
+
+    def pending_descriptions():
+        nonlocal skipped, duplicates
+        queued = 0
+        for record in itertools.chain([first_record], records):
+            item_id = record_id(record)
+            if journal.is_done(item_id):
+                skipped += 1
+                continue
+            if item_id in queued_ids:
+                duplicates += 1
+                continue
+            queued_ids.add(item_id)
+            item_ids[queued] = (item_id, record["description"])
+            queued += 1
+            yield record["description"]
+
+    def written(item_id, report):
+        # Journaled only once the report is on disk, so --resume never skips an unwritten item
+        description, analysis = analyses.pop(item_id)
+        journal.record(item_id, analysis)
+        if exporter is not None:
+            exporter.add(item_id, description, analysis)
+        print(f"\nAnalysis Report {item_id}:")
+        print(report if report is not None else f"Written to {writer.path}")
+        print("\n" + "="*80 + "\n", flush=True)
+
+    # Reports are written off the event loop while later analyses are still running
+    try:
+        try:
+            async for index, analysis in detector.analyze_stream(pending_descriptions(), args.concurrency, args.pack):
+                item_id, description = item_ids.pop(index)
+                # A failed analysis gets no report, rather than one with a made-up score of 0
+                if analysis.is_error:
+                    failed += 1
+                    print(f"\nAnalysis {item_id} failed: {analysis.error}", flush=True)
+                    continue
+                # Reports are named by source ID or content hash, so reruns overwrite rather than duplicate them
+                analyses[item_id] = (description, analysis)
+                await writer.write(item_id, analysis, written)
+        finally:
+            await writer.close()
             
     except Exception as e:
         print(f"Error during analysis: {str(e)}")
         return
+    finally:
+        journal.close()
+        if exporter is not None:
+            exporter.close()
+            print(f"Exported {exporter.exported} analyses to {exporter.path}")
+        if skipped:
+            print(f"Skipped {skipped} descriptions already completed in {journal.path}")
+        if duplicates:
+            print(f"Skipped {duplicates} duplicate descriptions")
+        if failed:
+            print(f"{failed} descriptions failed; rerun with --resume to retry them")
+        batch_stats = detector.batch_stats
+        if batch_stats["packed_requests"]:
+            print(f"Packed {batch_stats['packed_items']} descriptions into {batch_stats['packed_requests']} requests; "
+                  f"{batch_stats['fallbacks']} fell back to single requests")
+        client_stats = detector.client.stats()
+        if client_stats["retries"] or client_stats["failures"]:
+            print(f"Model calls: {client_stats['calls']}, retries: {client_stats['retries']}, "
+                  f"throttled: {client_stats['throttles']}, timeouts: {client_stats['timeouts']}, "
+                  f"failures: {client_stats['failures']}")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Analysis cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+                  f"{stats['misses']} misses ({stats['hit_ratio']:.0%} hit ratio)")
+            cache.close()
+        if args.metrics:
+            with open(args.metrics, 'w', encoding='utf-8') as f:
+                f.write(REGISTRY.render())
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,22 +1,34 @@
 import ipywidgets as widgets
-from IPython.display import display, HTML, clear_output
+from IPython.display import display, clear_output
 from IPython import __version__
-import json
 import asyncio
 from datetime import datetime
-import sqlite3
 from pathlib import Path
 import sys
 import traceback
-import io
-from contextlib import redirect_stdout
+from analysis_cache import AnalysisCache
+from feedback_store import get_feedback_store
+from instrumentation import capture_spans, record_span, summarize_spans
+from incremental_analysis import IncrementalAnalyzer
+from response_parser import AnalysisParseError, parse_analysis
 
 class JobBiasAnalyzerUI:
-    def __init__(self):
-        """Initialize the UI with enhanced debug capture"""
+    def __init__(self, backend=None):
+        """Initialize the UI with enhanced debug capture
+
+        Args:
+            backend: Optional ModelBackend for the detector; by default it is
+                chosen from $JOB_BIAS_BACKEND (Gemini when unset).
+        """
+        self.backend = backend
         try:
-            # Initialize database
+            # Initialize database and analysis cache
             self._init_database()
+            self.cache = AnalysisCache()
+            self.detector = None  # Created on first analysis and reused for the session
+            self.incremental = None  # Re-analyzes only the sentences changed since the last run
+            self.analysis_task = None  # The one analysis in flight, if any
+            self.analysis_description = None  # Text that task is analyzing
             
             # Create UI components
             self.create_ui_components()
@@ -59,29 +71,16 @@ class JobBiasAnalyzerUI:
             traceback.print_exc()
     
     def _init_database(self):
-        """Initialize SQLite database for feedback storage"""
-        db_path = Path("feedback.db")
-        self.conn = sqlite3.connect(str(db_path))
-        self.cursor = self.conn.cursor()
-        
-        # Create tables if they don't exist
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                term TEXT,
-                original_suggestion TEXT,
-                is_helpful BOOLEAN,
-                timestamp DATETIME,
-                context TEXT
-            )
-        """)
-        self.conn.commit()
+        """Open the shared feedback store (WAL mode, buffered batch writes)"""
+        self.feedback = get_feedback_store()
     
-    def log_debug(self, message, level="INFO"):
-        """Enhanced debug logging with timestamp"""
+    def log_debug(self, message, level="INFO", **fields):
+        """Debug log line with timestamp and key=value fields, also sent to the trace log"""
+        record_span("log", level=level, message=message, **fields)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        details = "".join(f" {name}={value}" for name, value in fields.items())
         with self.debug_output:
-            print(f"[{timestamp}] [{level}] {message}")
+            print(f"[{timestamp}] [{level}] {message}{details}")
             
         self.last_update_time = datetime.now()
         
@@ -91,7 +90,12 @@ class JobBiasAnalyzerUI:
             self.has_error = True
     
     def on_analyze_click(self, b):
-        """Handle analyze button click with enhanced debug capture"""
+        """Handle analyze button click with enhanced debug capture
+
+        One analysis runs at a time. Clicking again with the same text joins
+        the analysis already in flight; clicking with different text cancels
+        it first. Returns the task running the analysis.
+        """
         description = self.input_area.value.strip()
         
         if not description:
@@ -99,7 +103,13 @@ class JobBiasAnalyzerUI:
             with self.results_area:
                 clear_output(wait=True)
                 print("Please enter a job description to analyze.")
-            return
+            return None
+        
+        if self.analysis_in_progress():
+            if description == self.analysis_description:
+                self.log_debug("This description is already being analyzed; waiting for that result")
+                return self.analysis_task
+            self.cancel_analysis("a new description was submitted")
         
         # Reset error state
         self.has_error = False
@@ -111,57 +121,98 @@ class JobBiasAnalyzerUI:
             clear_output(wait=True)
             print("Analyzing...")
         
-        async def analyze():
-            try:
-                self.log_debug("Starting analysis")
-                
-                # Verify JobBiasDetector is imported and accessible
-                if not hasattr(sys.modules[__name__], 'JobBiasDetector'):
-                    self.log_debug("Attempting to import JobBiasDetector", "INFO")
-                    # Add your import statement here
-                    from job_bias_detector import JobBiasDetector
-                
-                # Create detector instance
-                detector = JobBiasDetector()
-                
-                # Capture stdout during analysis
-                stdout_capture = io.StringIO()
-                with redirect_stdout(stdout_capture):
-                    analysis = await detector.analyze_job_description(description)
-                
-                self.log_debug("Analysis completed successfully")
-                
-                # Log captured output
-                self.log_debug("=== Analysis Details ===")
-                self.log_debug(f"Input Length: {len(description)} characters")
-                self.log_debug(f"Raw Output: {stdout_capture.getvalue()}")
-                
-                # Update UI with results
-                self.current_analysis = analysis
-                self.display_results(analysis)
-                self.update_feedback_ui(analysis)
-                
-            except ImportError as e:
-                self.log_debug(f"Import error: {str(e)}", "ERROR")
-                self.log_debug(f"Current Python path: {sys.path}", "DEBUG")
-                
-            except Exception as e:
-                self.log_debug(f"Analysis error: {str(e)}", "ERROR")
-                self.log_debug(f"Traceback: {traceback.format_exc()}", "ERROR")
-                self.log_debug(f"Current state - Description length: {len(description)}", "DEBUG")
-                self.log_debug(f"Available modules: {list(sys.modules.keys())}", "DEBUG")
-        
-        # Create and run the async task with error handling
+        # Run the analysis as a task on the kernel's event loop; the model call itself runs in a worker thread
         try:
             loop = asyncio.get_running_loop()
-            if loop.is_running():
-                asyncio.create_task(analyze())
-            else:
-                loop.run_until_complete(analyze())
+        except RuntimeError:
+            loop = None
+        try:
+            if loop is None:
+                asyncio.run(self.analyze(description))
+                return None
+            self.analysis_description = description
+            self.analysis_task = loop.create_task(self.analyze(description))
+            return self.analysis_task
         except Exception as e:
             self.log_debug(f"Async execution error: {str(e)}", "ERROR")
             self.log_debug(traceback.format_exc(), "ERROR")
+            return None
+
+    def analysis_in_progress(self):
+        """True while an analysis task is running"""
+        return self.analysis_task is not None and not self.analysis_task.done()
+
+    def cancel_analysis(self, reason):
+        """Cancel the analysis in flight so its result never reaches the widgets"""
+        if self.analysis_in_progress():
+            self.analysis_task.cancel()
+            self.log_debug(f"Cancelled the running analysis: {reason}")
+        self.analysis_task = None
+        self.analysis_description = None
+
+    def on_input_change(self, change):
+        """Cancel an analysis of text that has since been edited"""
+        if self.analysis_in_progress() and change['new'].strip() != self.analysis_description:
+            self.cancel_analysis("the description was edited")
+            with self.results_area:
+                clear_output(wait=True)
+                print("The description changed; click 'Analyze' to analyze the new text.")
+
+    async def analyze(self, description):
+        """Analyze a description and show the results as they stream in"""
+        try:
+            self.log_debug("Starting analysis")
+            
+            self.get_detector()
+            
+            # Terms are shown as they stream in; stdout is left alone, since other cells
+            # keep running on the kernel loop while the analysis waits for the model
+            analysis = None
+            with capture_spans() as spans:
+                async for kind, payload in self.incremental.stream(description):
+                    if kind == "local":
+                        self.show_local_matches(payload)
+                    elif kind == "term":
+                        self.show_streamed_term(payload)
+                    else:
+                        analysis = payload
+            
+            stats = self.incremental.last_stats
+            self.log_debug("Analysis completed", chars=len(description), sentences_sent=stats['sentences_sent'],
+                           sentences_reused=stats['sentences_reused'])
+            if summarize_spans(spans):
+                self.log_debug("Analysis timings", steps=summarize_spans(spans))
+            
+            # Update UI with results
+            self.current_analysis = analysis
+            self.display_results(analysis)
+            self.update_feedback_ui(analysis)
+            return analysis
+            
+        except asyncio.CancelledError:
+            self.log_debug("Analysis cancelled")
+            raise
+            
+        except ImportError as e:
+            self.log_debug(f"Import error: {str(e)}", "ERROR")
+            
+        except Exception as e:
+            self.log_debug(f"Analysis error: {str(e)}", "ERROR", chars=len(description))
+            self.log_debug(f"Traceback: {traceback.format_exc()}", "ERROR")
     
+    def get_detector(self):
+        """Return the session's detector, creating it on first use"""
+        if self.detector is None:
+            self.log_debug("Attempting to import JobBiasDetector", "INFO")
+            try:
+                from job_bias_detector import JobBiasDetector
+            except ImportError:
+                from job_bias_detector_args import JobBiasDetector
+            # Each analysis stands alone, as it did when a detector was built per click
+            self.detector = JobBiasDetector(backend=self.backend, cache=self.cache, history_window=0)
+            self.incremental = IncrementalAnalyzer(self.detector)
+        return self.detector
+
     def create_ui_components(self):
         """Create all UI components with enhanced debug controls"""
         try:
@@ -178,6 +229,7 @@ class JobBiasAnalyzerUI:
                 layout=widgets.Layout(width='200px')
             )
             self.analyze_button.on_click(self.on_analyze_click)
+            self.input_area.observe(self.on_input_change, 'value')
             
             # Results area
             self.results_area = widgets.Output(
@@ -213,36 +265,51 @@ class JobBiasAnalyzerUI:
             print(f"UI component creation error: {str(e)}")
             traceback.print_exc()
     
+    def format_term(self, term):
+        """Text shown for one flagged term"""
+        return (f"\n- Term: {term['term']}\n"
+                f"  Severity: {term['severity']}/5\n"
+                f"  Suggestion: {term['suggestion']}\n"
+                f"  Explanation: {term['explanation']}\n")
+
+    def show_local_matches(self, local_analysis):
+        """Show bias_dict matches while the model is still working"""
+        if local_analysis.flagged_terms:
+            terms = ", ".join(dict.fromkeys(term["term"] for term in local_analysis.flagged_terms))
+            self.results_area.append_stdout(f"Dictionary matches: {terms}\n")
+        self.results_area.append_stdout("\nFlagged Terms (streaming):\n")
+
+    def show_streamed_term(self, term):
+        """Append a flagged term as soon as the model has produced it"""
+        self.results_area.append_stdout(self.format_term(term))
+
     def display_results(self, analysis):
         """Display analysis results with enhanced error handling"""
         try:
             with self.results_area:
                 clear_output(wait=True)
                 
-                if isinstance(analysis, str):
-                    try:
-                        analysis = json.loads(analysis)
-                    except json.JSONDecodeError:
-                        self.log_debug("Failed to parse analysis JSON", "ERROR")
-                        self.log_debug(f"Raw analysis: {analysis}", "DEBUG")
-                        print("Error: Invalid analysis format")
-                        return
+                # No-op for results the detector already parsed
+                try:
+                    analysis = parse_analysis(analysis)
+                except AnalysisParseError as e:
+                    self.log_debug(f"Failed to parse analysis JSON: {str(e)}", "ERROR")
+                    self.log_debug(f"Raw analysis: {analysis}", "DEBUG")
+                    print("Error: Invalid analysis format")
+                    return
                 
-                if "error" in analysis:
-                    self.log_debug(f"Analysis returned error: {analysis['error']}", "ERROR")
-                    print(f"Error: {analysis['error']}")
+                if analysis.is_error:
+                    self.log_debug(f"Analysis returned error: {analysis.error}", "ERROR")
+                    print(f"Error: {analysis.error}")
                     return
                 
                 self.log_debug("Displaying analysis results")
                 print("Analysis Results:")
-                print(f"Discrimination Score: {analysis.get('discrimination_score', 0)}/10")
+                print(f"Discrimination Score: {analysis.discrimination_score}/10")
                 print("\nFlagged Terms:")
                 
-                for term in analysis.get('flagged_terms', []):
-                    print(f"\n- Term: {term.get('term', '')}")
-                    print(f"  Severity: {term.get('severity', 0)}/5")
-                    print(f"  Suggestion: {term.get('suggestion', '')}")
-                    print(f"  Explanation: {term.get('explanation', '')}")
+                for term in analysis.flagged_terms:
+                    print(self.format_term(term), end="")
                 
         except Exception as e:
             self.log_debug(f"Display error: {str(e)}", "ERROR")
@@ -272,15 +339,13 @@ class JobBiasAnalyzerUI:
         return term_container
     
     def save_feedback(self, term, suggestion, is_helpful, context):
-        """Save feedback to database"""
-        self.cursor.execute("""
-            INSERT INTO feedback (term, original_suggestion, is_helpful, timestamp, context)
-            VALUES (?, ?, ?, ?, ?)
-        """, (term, suggestion, is_helpful, datetime.now(), context))
-        self.conn.commit()
+        """Queue feedback for the database; the store writes it in batches"""
+        self.feedback.add(term, suggestion, is_helpful, context)
     
     def update_feedback_ui(self, analysis):
         """Update feedback UI with new analysis results"""
+        # Feedback on the previous analysis is complete; write it in one transaction
+        self.feedback.flush()
         feedback_widgets = []
         
         for term_data in analysis.get('flagged_terms', []):
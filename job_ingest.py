@@ -0,0 +1,89 @@
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterator
+
+FORMATS = ("auto", "lines", "blocks", "jsonl", "csv")
+
+# Field names accepted for the description text in JSONL and CSV records
+DESCRIPTION_FIELDS = ("description", "job_description", "text")
+
+
+def detect_format(path: str) -> str:
+    """Guess the record format from the file extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if suffix == ".csv":
+        return "csv"
+    return "lines"
+
+
+def _description_from(record: Dict[str, str], source: str) -> str:
+    for field in DESCRIPTION_FIELDS:
+        if record.get(field):
+            return str(record[field])
+    raise ValueError(f"{source}: no description field (expected one of {', '.join(DESCRIPTION_FIELDS)})")
+
+
+def _iter_lines(f) -> Iterator[Dict[str, str]]:
+    """One description per non-empty line."""
+    for line in f:
+        if line.strip():
+            yield {"description": line.strip()}
+
+
+def _iter_blocks(f) -> Iterator[Dict[str, str]]:
+    """Descriptions separated by one or more blank lines; each may span several lines."""
+    block = []
+    for line in f:
+        if line.strip():
+            block.append(line.rstrip("\n"))
+        elif block:
+            yield {"description": "\n".join(block).strip()}
+            block = []
+    if block:
+        yield {"description": "\n".join(block).strip()}
+
+
+def _iter_jsonl(f) -> Iterator[Dict[str, str]]:
+    """One JSON object per line with a description field and an optional id."""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        item = {"description": _description_from(record, f"line {line_number}")}
+        if record.get("id") is not None:
+            item["id"] = str(record["id"])
+        yield item
+
+
+def _iter_csv(f) -> Iterator[Dict[str, str]]:
+    """CSV with a header row containing a description column and an optional id column."""
+    for row_number, row in enumerate(csv.DictReader(f), 2):
+        item = {"description": _description_from(row, f"row {row_number}")}
+        if row.get("id"):
+            item["id"] = row["id"]
+        yield item
+
+
+READERS = {
+    "lines": _iter_lines,
+    "blocks": _iter_blocks,
+    "jsonl": _iter_jsonl,
+    "csv": _iter_csv,
+}
+
+
+def iter_records(path: str, fmt: str = "auto") -> Iterator[Dict[str, str]]:
+    """Lazily yield job description records from a file.
+
+    Each record is a dict with a ``description`` and, when the input carries
+    one, an ``id``. Only the current record is held in memory.
+    """
+    if fmt == "auto":
+        fmt = detect_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unknown input format: {fmt}")
+    with open(path, 'r', encoding='utf-8', newline='' if fmt == "csv" else None) as f:
+        yield from READERS[fmt](f)
@@ -1,11 +1,29 @@
+import os
 import os.path
+import threading
+from datetime import datetime, timedelta, timezone
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from instrumentation import CREDENTIAL_LOAD, timed
+
 SCOPES = ['https://www.googleapis.com/auth/generative-language.retriever']
 
+# The file token.json stores the user's access and refresh tokens, and is
+# created automatically when the authorization flow completes for the first
+# time.
+TOKEN_JSON = r'<Root Dir>\token.json'
+CLIENT_SECRET = r'<Root Dir>\client_secret.json'
+
+# Refresh cached credentials this long before they actually expire
+REFRESH_MARGIN = timedelta(minutes=5)
+
+_cached_creds = None
+# Callers run in worker threads; only one of them loads or refreshes at a time
+_creds_lock = threading.Lock()
+
 def load_creds():
     """Converts `client_secret.json` to a credential object.
 
@@ -13,22 +31,49 @@ def load_creds():
     consent screen.
     """
     creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    token_json = r'<Root Dir>\token.json'
-    client_secret = r'<Root Dir>\client_secret.json'
-    if os.path.exists(token_json):
-        creds = Credentials.from_authorized_user_file(token_json, SCOPES)
+    if os.path.exists(TOKEN_JSON):
+        creds = Credentials.from_authorized_user_file(TOKEN_JSON, SCOPES)
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
             flow = InstalledAppFlow.from_client_secrets_file(
-                client_secret, SCOPES)
+                CLIENT_SECRET, SCOPES)
             creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open(token_json, 'w') as token:
-            token.write(creds.to_json())
-    return creds
\ No newline at end of file
+        save_creds(creds)
+    return creds
+
+def save_creds(creds):
+    """Save the credentials for the next run.
+
+    Written to a temporary file and renamed into place, so processes
+    refreshing at the same time never leave a torn token.json behind.
+    """
+    tmp = f"{TOKEN_JSON}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as token:
+        token.write(creds.to_json())
+    os.replace(tmp, TOKEN_JSON)
+
+def get_credentials():
+    """Returns process-wide credentials, loading them only once.
+
+    The cached credentials are refreshed in place when they are invalid or
+    within `REFRESH_MARGIN` of expiring, so long-lived sessions never pay for
+    `load_creds` again.
+    """
+    global _cached_creds
+    with _creds_lock:
+        if _cached_creds is None:
+            with timed(CREDENTIAL_LOAD, step="load"):
+                _cached_creds = load_creds()
+            return _cached_creds
+        # google-auth stores expiry as a naive UTC datetime
+        expiry = _cached_creds.expiry.replace(tzinfo=timezone.utc) if _cached_creds.expiry is not None else None
+        expiring = expiry is not None and expiry - REFRESH_MARGIN <= datetime.now(timezone.utc)
+        if (expiring or not _cached_creds.valid) and _cached_creds.refresh_token:
+            with timed(CREDENTIAL_LOAD, step="refresh"):
+                _cached_creds.refresh(Request())
+            # So the next process starts from the refreshed token instead of refreshing again
+            save_creds(_cached_creds)
+        return _cached_creds
@@ -0,0 +1,47 @@
+from typing import Iterable, Iterator, List, Tuple
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+# Tokens one analysis object takes in the response, excluding the rewritten description
+ANALYSIS_OUTPUT_TOKENS = 700
+
+# Item markers and the id wrapper around each description in a packed prompt
+ITEM_OVERHEAD_TOKENS = 20
+
+DEFAULT_TOKEN_BUDGET = 8192
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_item_tokens(description: str) -> int:
+    """Tokens a description costs in a packed request, counting both the prompt and its answer.
+
+    The answer dominates: a full analysis plus an improved description about
+    as long as the input.
+    """
+    return ITEM_OVERHEAD_TOKENS + ANALYSIS_OUTPUT_TOKENS + 2 * estimate_tokens(description)
+
+
+def plan_micro_batches(items: Iterable[Tuple[int, str]], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                       max_items: int = 50) -> Iterator[List[Tuple[int, str]]]:
+    """Greedily group ``(index, description)`` pairs into batches that fit the token budget.
+
+    Items are consumed lazily and a batch is yielded as soon as the next item
+    would not fit, so K adapts to description length: many short postings
+    share a request while a long one may go alone.
+    """
+    batch = []
+    used = 0
+    for index, description in items:
+        cost = estimate_item_tokens(description)
+        if batch and (used + cost > token_budget or len(batch) >= max_items):
+            yield batch
+            batch = []
+            used = 0
+        batch.append((index, description))
+        used += cost
+    if batch:
+        yield batch
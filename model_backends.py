@@ -0,0 +1,109 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from bias_matcher import BiasMatcher
+from fake_model import FakeGenerativeModel
+
+# Environment variable the CLI and UI read to pick a backend without code changes
+BACKEND_ENV_VAR = "JOB_BIAS_BACKEND"
+
+DESCRIPTION_PATTERN = re.compile(r'Job Description:\s*(.*?)\s*Provide your analysis', re.DOTALL)
+PACKED_ITEM_PATTERN = re.compile(r'<<<ITEM (.+?)>>>\n(.*?)\n<<<END ITEM \1>>>', re.DOTALL)
+
+
+class ModelBackend:
+    """Interface between JobBiasDetector and a text generation service.
+
+    A backend builds model objects exposing a blocking ``generate_content``
+    in the google.generativeai shape (a response with ``.text`` and
+    ``.candidates[0].content``, or with ``stream=True`` an iterable of
+    chunks with ``.text``).
+    """
+    name = "base"
+
+    def create_model(self, model_name: str, system_instruction: str, bias_dict: Dict[str, Any]):
+        """Return a model that answers with the given system instruction."""
+        raise NotImplementedError
+
+    def before_request(self) -> None:
+        """Hook run in a worker thread before each model call, e.g. to refresh credentials."""
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini through google.generativeai with OAuth credentials from load_creds."""
+    name = "gemini"
+
+    _configured_creds = None  # Shared across instances; genai.configure is process-wide
+
+    def __init__(self):
+        # Imported here so the rest of the pipeline works without the Google packages installed
+        import google.generativeai as genai
+        from load_creds import get_credentials
+        self.genai = genai
+        self.get_credentials = get_credentials
+        self.before_request()
+
+    def before_request(self) -> None:
+        """Configure the client once per credential object; get_credentials refreshes near expiry."""
+        creds = self.get_credentials()
+        if creds is not GeminiBackend._configured_creds:
+            self.genai.configure(credentials=creds)
+            GeminiBackend._configured_creds = creds
+
+    def create_model(self, model_name: str, system_instruction: str, bias_dict: Dict[str, Any]):
+        return self.genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+class FakeBackend(ModelBackend):
+    """Deterministic in-process backend for offline benchmarks and load tests.
+
+    Unless canned responses are given, each description is answered from the
+    bias_dict matcher, so output is realistic and reproducible.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 timeout_rate: float = 0.0, responses: Optional[List[Dict[str, Any]]] = None, seed: int = 0):
+        self.options = {
+            "latency": latency,
+            "error_rate": error_rate,
+            "throttle_rate": throttle_rate,
+            "timeout_rate": timeout_rate,
+            "responses": responses,
+            "seed": seed,
+        }
+        self.models = []  # Every model created, so tests and benchmarks can read their counters
+
+    def create_model(self, model_name: str, system_instruction: str, bias_dict: Dict[str, Any]):
+        matcher = BiasMatcher(bias_dict)
+
+        def analyzer(prompt: str) -> Any:
+            # Packed prompts get a JSON array keyed by item ID, like the real model is asked for
+            items = PACKED_ITEM_PATTERN.findall(prompt)
+            if items:
+                return [{"id": item_id, "analysis": matcher.analyze(text)} for item_id, text in items]
+            match = DESCRIPTION_PATTERN.search(prompt)
+            return matcher.analyze(match.group(1) if match else prompt)
+
+        model = FakeGenerativeModel(model_name, system_instruction, analyzer=analyzer, **self.options)
+        self.models.append(model)
+        return model
+
+    @property
+    def calls(self) -> int:
+        return sum(model.calls for model in self.models)
+
+
+BACKENDS: Dict[str, Callable[..., ModelBackend]] = {
+    GeminiBackend.name: GeminiBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def create_backend(name: Optional[str] = None, **options) -> ModelBackend:
+    """Build a backend by name, defaulting to $JOB_BIAS_BACKEND and then Gemini."""
+    name = name or os.environ.get(BACKEND_ENV_VAR, GeminiBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
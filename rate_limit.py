@@ -0,0 +1,345 @@
+import asyncio
+import contextvars
+import functools
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional
+
+from instrumentation import (MODEL_FIRST_BYTE, MODEL_TOTAL, REQUEST_BYTES, REQUEST_TOKENS, RESPONSE_BYTES,
+                             RESPONSE_TOKENS, record_span)
+from micro_batch import estimate_tokens
+
+# Exception class names used by google.api_core for throttling and transient failures
+THROTTLE_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+TRANSIENT_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout", "Aborted"}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+# Default upper bound of model calls in flight (and of the threads running them)
+DEFAULT_MAX_MODEL_CALLS = 32
+
+RETRY_HINT_PATTERNS = [
+    re.compile(r'retry in (\d+(?:\.\d+)?)\s*s', re.IGNORECASE),
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)', re.IGNORECASE),
+]
+
+
+class RetriesExhaustedError(Exception):
+    """Raised when a model call still fails after every allowed retry."""
+
+    def __init__(self, kind: str, attempts: int, last_error: Exception):
+        self.kind = kind
+        self.attempts = attempts
+        self.last_error = last_error
+        super().__init__(f"{kind} after {attempts} attempts: {str(last_error) or type(last_error).__name__}")
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """Return 'throttle', 'timeout' or 'transient' for retryable errors, None otherwise."""
+    name = type(error).__name__
+    code = getattr(error, "code", None)
+    if name in THROTTLE_ERRORS or code == 429:
+        return "throttle"
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or name == "DeadlineExceeded":
+        return "timeout"
+    if isinstance(error, ConnectionError) or name in TRANSIENT_ERRORS or code in TRANSIENT_STATUS_CODES:
+        return "transient"
+    return None
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from a retry_after attribute or the error text."""
+    hint = getattr(error, "retry_after", None)
+    if hint is not None:
+        return float(hint)
+    for pattern in RETRY_HINT_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Client-side rate limiter allowing `rate` requests per second with bursts up to `capacity`."""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Take a token, sleeping until one is available.
+
+        Tokens are reserved before sleeping, so concurrent callers queue up
+        behind each other instead of all waking at once.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, max_limit: int = 32, min_limit: int = 1, increase_after: int = 10):
+        """AIMD limit on in-flight calls: halved on throttling, raised by one after a run of successes."""
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.increase_after = increase_after
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = None
+        self._loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Conditions are bound to an event loop; recreate one if the detector moved to a new loop
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.increase_after:
+            self._successes = 0
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def on_throttle(self) -> None:
+        self._successes = 0
+        self.limit = max(self.min_limit, self.limit / 2)
+
+
+class ResilientModel:
+    def __init__(self, model, requests_per_second: Optional[float] = None, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 60.0, timeout: Optional[float] = None,
+                 max_concurrency: int = DEFAULT_MAX_MODEL_CALLS):
+        """Wraps a model with rate limiting, retries with jittered backoff and adaptive concurrency.
+
+        Args:
+            model: Object exposing a blocking ``generate_content``.
+            requests_per_second: Token bucket rate, or None for no rate limit.
+            max_retries: Retries after the first attempt for retryable errors.
+            base_delay: First backoff delay in seconds; doubles on each retry.
+            max_delay: Upper bound for a single backoff delay.
+            timeout: Seconds before an attempt counts as timed out, or None.
+            max_concurrency: Upper bound of the adaptive in-flight limit; the
+                blocking calls run on a pool of this many threads, as the
+                default executor would cap them at min(32, cpus + 4).
+        """
+        self.model = model
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="model-call")
+        self._releases = set()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.counters = {"calls": 0, "retries": 0, "throttles": 0, "timeouts": 0, "failures": 0}
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before the next attempt: the server's hint if any, else full-jitter exponential backoff."""
+        hint = retry_after_hint(error)
+        if hint is not None:
+            return min(hint, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record_call(self, mode: str, contents: Any, started: float, first_byte: Optional[float],
+                     text: str, error: Optional[Exception] = None, usage: Any = None) -> None:
+        """Record latency, sizes and tokens of one model call attempt."""
+        now = time.perf_counter()
+        outcome = "ok" if error is None else classify_error(error) or "error"
+        MODEL_TOTAL.observe(now - started, mode=mode, outcome=outcome)
+        if first_byte is not None:
+            MODEL_FIRST_BYTE.observe(first_byte - started, mode=mode)
+        request_text = json.dumps(contents, default=str)
+        request_bytes = len(request_text.encode('utf-8'))
+        response_bytes = len(text.encode('utf-8'))
+        REQUEST_BYTES.observe(request_bytes, mode=mode)
+        # Gemini reports token counts; otherwise (and for streams) they are estimated from the text
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(request_text)
+        REQUEST_TOKENS.inc(prompt_tokens, mode=mode)
+        if error is None:
+            RESPONSE_BYTES.observe(response_bytes, mode=mode)
+            RESPONSE_TOKENS.inc(getattr(usage, "candidates_token_count", None) or estimate_tokens(text), mode=mode)
+        record_span("model_call", now - started, mode=mode, outcome=outcome,
+                    first_byte_seconds=None if first_byte is None else round(first_byte - started, 6),
+                    request_bytes=request_bytes, response_bytes=response_bytes)
+
+    async def _start_call(self, func, *args) -> asyncio.Future:
+        """Take a limiter slot and start a blocking call on the model thread pool.
+
+        The context is carried along like asyncio.to_thread does. A thread
+        cannot be interrupted, so the slot is given back when the call
+        returns rather than when the caller stops waiting: a timed out call
+        that is still running keeps its slot, and a retry cannot add to the
+        load of a backend that is already slow.
+        """
+        await self.limiter.acquire()
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, future: asyncio.Future) -> None:
+        if not future.cancelled():
+            # Mark the outcome of an abandoned call as retrieved
+            future.exception()
+        release = asyncio.ensure_future(self.limiter.release())
+        self._releases.add(release)
+        release.add_done_callback(self._releases.discard)
+
+    async def _wait(self, awaitable: Any) -> Any:
+        """Await with the per-attempt timeout, raising a TimeoutError that says how long it waited."""
+        if self.timeout is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no response within {self.timeout:g}s") from None
+
+    async def _attempt(self, contents: Any) -> Any:
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        call = await self._start_call(self.model.generate_content, contents)
+        self.counters["calls"] += 1
+        started = time.perf_counter()
+        try:
+            # Shielded so giving up on the call does not hand its slot back while the thread still runs
+            response = await self._wait(asyncio.shield(call))
+        except Exception as e:
+            self._record_call("unary", contents, started, None, "", e)
+            raise
+        try:
+            text = response.text
+        except Exception:
+            # Blocked or empty candidates; the caller deals with that
+            text = ""
+        # Without streaming the first byte arrives with the whole response
+        self._record_call("unary", contents, started, time.perf_counter(), text,
+                          usage=getattr(response, "usage_metadata", None))
+        return response
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Count a failed attempt and return the delay before retrying, or raise if it may not be retried."""
+        kind = classify_error(error)
+        if kind == "throttle":
+            self.counters["throttles"] += 1
+            self.limiter.on_throttle()
+        elif kind == "timeout":
+            self.counters["timeouts"] += 1
+        if kind is None:
+            self.counters["failures"] += 1
+            raise error
+        if attempt == self.max_retries:
+            self.counters["failures"] += 1
+            raise RetriesExhaustedError(kind, attempt + 1, error) from error
+        self.counters["retries"] += 1
+        return self._backoff(attempt, error)
+
+    async def generate_content_async(self, contents: Any) -> Any:
+        """Call the model, retrying throttled, timed out and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._attempt(contents)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e))
+            else:
+                self.limiter.on_success()
+                return response
+
+    async def _attempt_stream(self, contents: Any) -> AsyncIterator[str]:
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        abandoned = threading.Event()
+
+        def produce():
+            # The blocking iteration runs in a worker thread and hands chunks back to the loop
+            try:
+                for chunk in self.model.generate_content(contents, stream=True):
+                    if abandoned.is_set():
+                        # Nobody is reading any more; stop at the next chunk to free the slot
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        await self._start_call(produce)
+        self.counters["calls"] += 1
+        started = time.perf_counter()
+        first_byte = None
+        received = []
+        try:
+            while True:
+                # With a timeout it bounds the wait for each chunk rather than the whole answer
+                item = await self._wait(queue.get())
+                if item is finished:
+                    self._record_call("stream", contents, started, first_byte, "".join(received))
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                received.append(item)
+                yield item
+        except Exception as e:
+            self._record_call("stream", contents, started, first_byte, "".join(received), e)
+            raise
+        finally:
+            abandoned.set()
+
+    async def stream_content_async(self, contents: Any) -> AsyncIterator[str]:
+        """Stream the response text chunk by chunk.
+
+        Failures before the first chunk are retried like generate_content_async;
+        once text has been yielded an error is raised as it is, since the
+        caller has already consumed part of the answer.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async for text in self._attempt_stream(contents):
+                    started = True
+                    yield text
+            except Exception as e:
+                if started:
+                    self.counters["failures"] += 1
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, e))
+            else:
+                self.limiter.on_success()
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus the current adaptive concurrency limit."""
+        return {**self.counters, "concurrency_limit": int(self.limiter.limit)}
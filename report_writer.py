@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from instrumentation import REPORT_RENDER, timed
+from response_parser import parse_analysis
+
+OUTPUT_FORMATS = ("txt", "jsonl", "parquet")
+
+WrittenCallback = Callable[[str, Optional[str]], None]
+
+# Rows buffered before a Parquet row group is written
+PARQUET_ROW_GROUP = 1000
+
+# Characters of an item ID that are replaced in report filenames
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w.-]')
+
+# The header keeps the indentation the report has always had
+REPORT_HEADER = """Job Description Bias Analysis Report
+                {rule}
+
+                OVERALL METRICS
+                {section_rule}
+                Discrimination Score: {score}/10
+                Confidence Level: {confidence:.1f}%
+
+                DISCRIMINATION CATEGORIES ANALYSIS
+                {section_rule}"""
+
+
+def render_report(analysis: Dict[str, Any]) -> str:
+    """Render the text report for an analysis.
+
+    Builds a list of parts and joins it once, instead of growing a string
+    with += for every line.
+    """
+    with timed(REPORT_RENDER):
+        return _render(parse_analysis(analysis))
+
+
+def _render(analysis: Dict[str, Any]) -> str:
+    section_rule = '-' * 40
+    parts = [REPORT_HEADER.format(rule='=' * 80, section_rule=section_rule,
+                                  score=analysis.get('discrimination_score'),
+                                  confidence=analysis.get('confidence_level') * 100)]
+
+    for category, details in analysis.get('discrimination_categories', {}).items():
+        parts.append(f"\n\n{category.replace('_', ' ').title()}:"
+                     f"\n  Instances: {details['count']}"
+                     f"\n  Average Severity: {details['severity']}/5"
+                     f"\n  Problematic Terms: {', '.join(details['terms'])}")
+
+    parts.append(f"\n\nDETAILED TERM ANALYSIS\n{section_rule}")
+    for term in analysis.get('flagged_terms', []):
+        parts.append(f"\n\nFlagged Term: {term['term']}"
+                     f"\nCategories: {', '.join(term['categories'])}"
+                     f"\nContext: \"{term['context']}\""
+                     f"\nSeverity: {term['severity']}/5"
+                     f"\nExplanation: {term['explanation']}"
+                     f"\nCompounding Effects: {term['compounding_effects']}"
+                     f"\nSuggested Replacement: {term['suggestion']}")
+
+    parts.append(f"\n\nCOMPOUNDING EFFECTS SUMMARY\n{section_rule}\n{analysis.get('compounding_effects_summary')}")
+    parts.append(f"\n\nRISK ASSESSMENT\n{section_rule}\n{analysis.get('overall_risk_assessment')}")
+    parts.append(f"\n\nIMPROVED JOB DESCRIPTION\n{section_rule}\n{analysis.get('improved_description')}")
+    return "".join(parts)
+
+
+def next_free_path(path: Path) -> Path:
+    """path, or path with a .N suffix before the extension if it already exists."""
+    candidate = path
+    number = 1
+    while candidate.exists():
+        number += 1
+        candidate = path.with_name(f"{path.stem}.{number}{path.suffix}")
+    return candidate
+
+
+class ReportWriter:
+    def __init__(self, output_dir: Union[str, Path], output_format: str = "txt", max_workers: int = 4,
+                 max_pending: int = 64, append: bool = False):
+        """Write analysis results as they stream in, off the event loop.
+
+        ``txt`` renders and writes one job_analysis_report_<id>.txt per
+        analysis on a thread pool. ``jsonl`` and ``parquet`` write a single
+        consolidated analyses.jsonl / analyses.parquet instead; Parquet needs
+        pyarrow. At most ``max_pending`` writes are queued, so a fast
+        producer waits instead of holding every result in memory. An item
+        only counts as written once its output is on disk: a jsonl line is
+        flushed and fsynced, and a Parquet row once its row group is written.
+
+        Args:
+            output_dir: Directory for the reports.
+            output_format: One of OUTPUT_FORMATS.
+            max_workers: Threads rendering and writing txt reports.
+            max_pending: Writes queued or running before write() waits.
+            append: Add to an existing analyses.jsonl (e.g. on --resume);
+                Parquet files cannot be appended to, so a new numbered file
+                is started instead.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_dir = Path(output_dir)
+        self.output_format = output_format
+        self.max_pending = max_pending
+        self.written = 0
+        self._slots = None
+        self._pending = set()
+        self._errors: List[BaseException] = []
+        # Consolidated files have a single writer thread so lines and row groups never interleave
+        self._pool = ThreadPoolExecutor(max_workers=max_workers if output_format == "txt" else 1)
+        self._file = None
+        self._parquet = None
+        self._rows: List[Dict[str, Any]] = []
+        self._row_callbacks: List[Tuple[Optional[WrittenCallback], str, Optional[str]]] = []
+
+        if output_format == "jsonl":
+            self.path = self.output_dir / "analyses.jsonl"
+            self._file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        elif output_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+            self._pyarrow = pyarrow
+            self.path = self.output_dir / "analyses.parquet"
+            if append:
+                self.path = next_free_path(self.path)
+        else:
+            self.path = self.output_dir
+
+    def report_path(self, item_id: str) -> Path:
+        # Source IDs can contain anything, e.g. slashes; keep the report inside output_dir
+        return self.output_dir / f"job_analysis_report_{UNSAFE_FILENAME_CHARS.sub('_', item_id)}.txt"
+
+    def _write_txt(self, item_id: str, analysis: Dict[str, Any]) -> str:
+        report = render_report(analysis)
+        with open(self.report_path(item_id), 'w') as f:
+            f.write(report)
+        return report
+
+    def _write_jsonl(self, item_id: str, analysis: Dict[str, Any]) -> None:
+        self._file.write(json.dumps({"id": item_id, "analysis": analysis}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_parquet(self, item_id: str, analysis: Dict[str, Any], on_written: Optional[WrittenCallback]):
+        """Buffer a row; returns the callbacks of the rows written if this completes a row group."""
+        self._row_callbacks.append((on_written, item_id, None))
+        self._rows.append({
+            "id": item_id,
+            "discrimination_score": float(analysis.get("discrimination_score") or 0),
+            "confidence_level": float(analysis.get("confidence_level") or 0),
+            "flagged_term_count": len(analysis.get("flagged_terms", [])),
+            "analysis": json.dumps(analysis),
+        })
+        if len(self._rows) >= PARQUET_ROW_GROUP:
+            return self._flush_parquet()
+        return []
+
+    def _flush_parquet(self) -> List[Tuple[Optional[WrittenCallback], str, Optional[str]]]:
+        if not self._rows:
+            return []
+        table = self._pyarrow.Table.from_pylist(self._rows)
+        if self._parquet is None:
+            self._parquet = self._pyarrow.parquet.ParquetWriter(str(self.path), table.schema)
+        self._parquet.write_table(table)
+        flushed = self._row_callbacks
+        self._rows = []
+        self._row_callbacks = []
+        return flushed
+
+    def _write(self, item_id: str, analysis: Dict[str, Any], on_written: Optional[WrittenCallback]):
+        """Runs on the pool; returns ``(on_written, item_id, report)`` for every item now on disk.
+
+        That is the item itself for txt (with its rendered report) and jsonl;
+        for Parquet it is every buffered item once their row group is written.
+        """
+        if self.output_format == "txt":
+            return [(on_written, item_id, self._write_txt(item_id, analysis))]
+        if self.output_format == "jsonl":
+            self._write_jsonl(item_id, analysis)
+            return [(on_written, item_id, None)]
+        return self._write_parquet(item_id, analysis, on_written)
+
+    def _written(self, items: List[Tuple[Optional[WrittenCallback], str, Optional[str]]]) -> None:
+        """Count items that reached the disk and run their callbacks, on the event loop."""
+        for on_written, item_id, report in items:
+            self.written += 1
+            if on_written is not None:
+                on_written(item_id, report)
+
+    async def write(self, item_id: str, analysis: Dict[str, Any], on_written: Optional[WrittenCallback] = None) -> None:
+        """Queue an analysis for writing, waiting only if max_pending writes are outstanding.
+
+        ``on_written(item_id, report)`` runs on the event loop once the
+        output is on disk, which for Parquet is when its row group has been
+        written (at the latest in close()); ``report`` is the rendered text
+        for txt output, None otherwise. A failed write is re-raised by close().
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(self._pool, self._write, item_id, analysis, on_written)
+        self._pending.add(future)
+
+        def done(finished: asyncio.Future) -> None:
+            self._pending.discard(finished)
+            self._slots.release()
+            if finished.cancelled():
+                return
+            if finished.exception() is not None:
+                self._errors.append(finished.exception())
+                return
+            self._written(finished.result())
+
+        future.add_done_callback(done)
+
+    async def close(self) -> None:
+        """Wait for queued writes, finish consolidated files and raise the first write error, if any."""
+        if self._pending:
+            await asyncio.wait(set(self._pending))
+        loop = asyncio.get_running_loop()
+        if self._file is not None:
+            await loop.run_in_executor(self._pool, self._file.close)
+        if self.output_format == "parquet":
+            self._written(await loop.run_in_executor(self._pool, self._close_parquet))
+        self._pool.shutdown()
+        if self._errors:
+            raise self._errors[0]
+
+    def _close_parquet(self) -> List[Tuple[Optional[WrittenCallback], str, Optional[str]]]:
+        flushed = self._flush_parquet()
+        if self._parquet is not None:
+            self._parquet.close()
+        return flushed
@@ -0,0 +1,282 @@
+import json
+import re
+from typing import Any, Dict, List, Union
+
+# orjson is considerably faster on large responses; fall back to the standard library
+try:
+    import orjson
+
+    def _loads(text: str) -> Any:
+        return orjson.loads(text)
+except ImportError:
+    _loads = json.loads
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+FLAGGED_TERMS_START = re.compile(r'"flagged_terms"\s*:\s*\[')
+
+TEXT_FIELDS = ("compounding_effects_summary", "overall_risk_assessment", "improved_description")
+TERM_TEXT_FIELDS = ("term", "context", "explanation", "suggestion", "compounding_effects")
+REQUIRED_FIELDS = ("discrimination_score", "flagged_terms")
+
+
+class AnalysisParseError(ValueError):
+    """Raised when a model response does not contain a usable analysis."""
+
+
+class AnalysisResult(dict):
+    """A parsed and validated analysis.
+
+    It is a dict so existing ``analysis.get(...)`` callers, the cache and the
+    journal keep working unchanged, with typed accessors for the main fields.
+    """
+
+    @property
+    def error(self) -> Union[str, None]:
+        return self.get("error")
+
+    @property
+    def is_error(self) -> bool:
+        return "error" in self
+
+    @property
+    def discrimination_score(self) -> float:
+        return self["discrimination_score"]
+
+    @property
+    def confidence_level(self) -> float:
+        return self["confidence_level"]
+
+    @property
+    def flagged_terms(self) -> List[Dict[str, Any]]:
+        return self["flagged_terms"]
+
+    @property
+    def discrimination_categories(self) -> Dict[str, Dict[str, Any]]:
+        return self["discrimination_categories"]
+
+
+def extract_json_span(text: str) -> str:
+    """Return the outermost JSON object or array in text, skipping ```json fences and chatter."""
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise AnalysisParseError("No JSON found in model response")
+    start = min(starts)
+    end = text.rfind('}' if text[start] == '{' else ']')
+    if end < start:
+        raise AnalysisParseError("Unterminated JSON in model response")
+    return text[start:end + 1]
+
+
+def _to_number(value: Any, default: float = 0) -> Union[int, float]:
+    """Coerce values such as 7, "7", "7.5" or "7/10" to a number."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        match = NUMBER_PATTERN.search(str(value)) if value is not None else None
+        if not match:
+            return default
+        number = float(match.group(0))
+    return int(number) if float(number).is_integer() else number
+
+
+def _to_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    return [value]
+
+
+def _normalize_term(term: Any) -> Dict[str, Any]:
+    if not isinstance(term, dict):
+        term = {"term": str(term)}
+    normalized = dict(term)
+    for field in TERM_TEXT_FIELDS:
+        value = normalized.get(field)
+        normalized[field] = "" if value is None else str(value)
+    normalized["categories"] = [str(c) for c in _to_list(normalized.get("categories"))]
+    normalized["severity"] = min(5, max(0, int(_to_number(normalized.get("severity")))))
+    return normalized
+
+
+def _normalize_categories(categories: Any) -> Dict[str, Dict[str, Any]]:
+    if not isinstance(categories, dict):
+        return {}
+    normalized = {}
+    for name, details in categories.items():
+        details = details if isinstance(details, dict) else {}
+        normalized[name] = {
+            **details,
+            "count": int(_to_number(details.get("count"))),
+            "severity": _to_number(details.get("severity")),
+            "terms": [str(t) for t in _to_list(details.get("terms"))]
+        }
+    return normalized
+
+
+def normalize_analysis(data: Dict[str, Any]) -> AnalysisResult:
+    """Validate an analysis dict and coerce its fields to the expected types.
+
+    A result must carry ``discrimination_score`` and a ``flagged_terms``
+    list; anything else (a refusal, an empty object) raises
+    AnalysisParseError rather than passing for a clean score of 0. Error
+    results are exempt, they only need their ``error``.
+    """
+    if "error" not in data:
+        missing = [field for field in REQUIRED_FIELDS if data.get(field) is None]
+        if missing:
+            raise AnalysisParseError(f"Analysis is missing {', '.join(missing)}")
+        if not isinstance(data["flagged_terms"], list):
+            raise AnalysisParseError("Analysis flagged_terms is not a list")
+    result = AnalysisResult(data)
+    result["flagged_terms"] = [_normalize_term(t) for t in _to_list(data.get("flagged_terms"))]
+    result["discrimination_score"] = _to_number(data.get("discrimination_score"))
+    result["confidence_level"] = _to_number(data.get("confidence_level"))
+    result["discrimination_categories"] = _normalize_categories(data.get("discrimination_categories"))
+    for field in TEXT_FIELDS:
+        value = data.get(field)
+        result[field] = "" if value is None else str(value)
+    return result
+
+
+def _decode(raw: Any) -> Any:
+    """Decode the JSON span of a raw response."""
+    if not isinstance(raw, str) or not raw.strip():
+        raise AnalysisParseError("Empty model response")
+    try:
+        return _loads(extract_json_span(raw))
+    except AnalysisParseError:
+        raise
+    except ValueError as e:
+        raise AnalysisParseError(f"Invalid JSON in model response: {str(e)}")
+
+
+def parse_analysis(raw: Union[str, Dict[str, Any]]) -> AnalysisResult:
+    """Parse a model response (or an already decoded dict) into an AnalysisResult.
+
+    Already parsed results are returned as they are, so callers further down
+    the pipeline can call this without paying for a second parse.
+    """
+    if isinstance(raw, AnalysisResult):
+        return raw
+    if isinstance(raw, dict):
+        return normalize_analysis(raw)
+    data = _decode(raw)
+    if not isinstance(data, dict):
+        raise AnalysisParseError("Model response is not a JSON object")
+    return normalize_analysis(data)
+
+
+def parse_analysis_batch(raw: str) -> Dict[str, AnalysisResult]:
+    """Split a packed response into analyses keyed by item ID.
+
+    Accepts ``[{"id": ..., "analysis": {...}}, ...]``, the same list wrapped
+    in an object, or an object mapping IDs to analyses. Items that are
+    malformed are left out so the caller can retry just those.
+    """
+    data = _decode(raw)
+
+    if isinstance(data, dict):
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if lists:
+            data = lists[0]
+        else:
+            data = [{"id": key, "analysis": value} for key, value in data.items()]
+    if not isinstance(data, list):
+        raise AnalysisParseError("Packed response is not a JSON array")
+
+    analyses = {}
+    for item in data:
+        if not isinstance(item, dict) or item.get("id") is None:
+            continue
+        analysis = item.get("analysis")
+        if analysis is None:
+            # Tolerate the analysis fields being inlined next to the id
+            analysis = {key: value for key, value in item.items() if key != "id"}
+        if not isinstance(analysis, dict):
+            continue
+        try:
+            analyses[str(item["id"])] = normalize_analysis(analysis)
+        except AnalysisParseError:
+            # e.g. a bare {"id": ...}; left out so the item falls back to a single call
+            continue
+    return analyses
+
+
+class StreamingTermParser:
+    """Pick complete ``flagged_terms`` entries out of a response as it streams in.
+
+    Feed it the response text chunk by chunk; each call returns the terms
+    whose JSON object has been closed since the previous call, normalized
+    like parse_analysis would. The full text is kept in ``buffer`` for the
+    final parse_analysis once the stream ends.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._position = None  # Where scanning resumes inside the flagged_terms array
+        self._finished = False
+
+    def _object_end(self, start: int) -> int:
+        """Index of the brace closing the object opening at start, or -1 if it has not arrived yet."""
+        depth = 0
+        in_string = False
+        escaped = False
+        for index in range(start, len(self.buffer)):
+            char = self.buffer[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return index
+        return -1
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add a chunk of response text and return the flagged terms it completed."""
+        self.buffer += text
+        terms = []
+        if self._finished:
+            return terms
+        if self._position is None:
+            match = FLAGGED_TERMS_START.search(self.buffer)
+            if not match:
+                return terms
+            self._position = match.end()
+
+        while self._position < len(self.buffer):
+            char = self.buffer[self._position]
+            if char.isspace() or char == ',':
+                self._position += 1
+            elif char == ']':
+                self._finished = True
+                break
+            elif char == '{':
+                end = self._object_end(self._position)
+                if end == -1:
+                    break
+                try:
+                    term = _loads(self.buffer[self._position:end + 1])
+                except ValueError:
+                    term = None  # The final parse decides what to do with a malformed entry
+                if isinstance(term, dict):
+                    terms.append(_normalize_term(term))
+                self._position = end + 1
+            else:
+                # Not an array of objects; leave it to the final parse
+                self._finished = True
+                break
+        return terms
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from analysis_service import AnalysisQueue, AnalysisService
+from job_bias_detector_args import JobBiasDetector
+from model_backends import FakeBackend
+
+
+async def start_service(latency=0.0, dispatch=True, **queue_options):
+    detector = JobBiasDetector(backend=FakeBackend(latency=latency), history_window=0)
+    queue = AnalysisQueue(detector, **queue_options)
+    service = AnalysisService(detector, queue)
+    if dispatch:
+        queue.start()
+    server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+    return service, server, server.sockets[0].getsockname()[1]
+
+
+async def send(port, raw):
+    """Send one raw request and return (status, headers, body)."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, json.loads(body)
+
+
+async def post(port, path, body):
+    body = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+    return await send(port, f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                            f"Connection: close\r\n\r\n".encode('latin-1') + body)
+
+
+def run_with_service(test, **options):
+    """Run test(port) against a fresh service; returns the service and the test's result."""
+    async def run():
+        service, server, port = await start_service(**options)
+        try:
+            return service, await test(port)
+        finally:
+            server.close()
+            await service.queue.stop()
+    return asyncio.run(run())
+
+
+def test_identical_queued_descriptions_share_one_model_call():
+    async def test(port):
+        return await asyncio.gather(*(post(port, "/analyze", {"description": "We need a young rockstar."})
+                                      for _ in range(10)))
+
+    service, responses = run_with_service(test, latency=0.2)
+    assert [status for status, _, _ in responses] == [200] * 10
+    assert len({payload["id"] for _, _, payload in responses}) == 1
+    assert service.detector.model_calls == 1
+    assert service.queue.counters["coalesced"] == 9
+
+
+def test_a_full_queue_answers_429_with_retry_after():
+    async def test(port):
+        return await post(port, "/analyze/batch", {"descriptions": ["first posting", "second", "third"]})
+
+    # Without a dispatcher nothing leaves the queue
+    _, (status, headers, payload) = run_with_service(test, dispatch=False, max_queue=2)
+    assert status == 429
+    assert headers["Retry-After"] == "1"
+    assert "Queue full" in payload["error"]
+
+
+def test_malformed_bodies_answer_400():
+    async def test(port):
+        return await asyncio.gather(
+            post(port, "/analyze", b'{"description": '),
+            post(port, "/analyze", [1, 2]),
+            post(port, "/analyze", {"text": "no description field"}),
+            post(port, "/analyze/batch", {"descriptions": "not a list"}),
+            send(port, b"NONSENSE\r\n\r\n"),
+        )
+
+    _, responses = run_with_service(test, dispatch=False)
+    assert [status for status, _, _ in responses] == [400] * 5
+    assert all("error" in payload for _, _, payload in responses)
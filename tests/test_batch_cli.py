@@ -0,0 +1,49 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_batch(tmp_path, *args):
+    env = {**os.environ, "JOB_BIAS_BACKEND": "fake"}
+    env.pop("JOB_BIAS_TRACE", None)
+    return subprocess.run([sys.executable, str(ROOT / "job_bias_detector_args.py"), "--no-cache", *args],
+                          cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_duplicate_descriptions_are_analyzed_once(tmp_path):
+    description = "We need a young rockstar who can work long hours."
+    (tmp_path / "input.txt").write_text(f"{description}\n{description}\nA clear, inclusive posting.\n")
+
+    result = run_batch(tmp_path, "-c", "4", "-f", "input.txt", "-o", "out")
+
+    assert result.returncode == 0, result.stderr
+    assert "Traceback" not in result.stdout + result.stderr
+    assert "Skipped 1 duplicate descriptions" in result.stdout
+    reports = sorted((tmp_path / "out").glob("job_analysis_report_*.txt"))
+    assert len(reports) == 2
+    journal = [json.loads(line) for line in (tmp_path / "out" / "batch_journal.jsonl").read_text().splitlines()]
+    assert len(journal) == 2
+    assert len({entry["id"] for entry in journal}) == 2
+
+
+def test_source_ids_name_reports_journal_entries_and_export_rows(tmp_path):
+    records = [{"id": "posting/17", "description": "We need a young rockstar."},
+               {"id": "posting-18", "description": "A clear, inclusive posting."}]
+    (tmp_path / "input.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    result = run_batch(tmp_path, "-c", "2", "-f", "input.jsonl", "-o", "out", "--export", "corpus.db")
+
+    assert result.returncode == 0, result.stderr
+    assert sorted(path.name for path in (tmp_path / "out").glob("job_analysis_report_*.txt")) == [
+        "job_analysis_report_posting-18.txt", "job_analysis_report_posting_17.txt"]
+    journal = [json.loads(line) for line in (tmp_path / "out" / "batch_journal.jsonl").read_text().splitlines()]
+    assert sorted(entry["id"] for entry in journal) == ["posting-18", "posting/17"]
+    with sqlite3.connect(str(tmp_path / "corpus.db")) as conn:
+        rows = conn.execute("SELECT id, description_id FROM analyses ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == ["posting-18", "posting/17"]
+    assert all(len(row[1]) == 16 for row in rows)
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus_runner import CorpusRun, merge_corpus, run_worker
+
+SHARDS = 4
+ITEMS = 40
+
+
+def make_run(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text("".join(json.dumps({"id": f"posting-{n}", "description": f"Young rockstar wanted, opening {n}."})
+                              + "\n" for n in range(ITEMS)))
+    run = CorpusRun(str(tmp_path / "run"))
+    run.split(str(corpus), "auto", SHARDS)
+    return run
+
+
+def worker_options(run, worker=0, workers=1, latency=0.0):
+    return {"run_dir": str(run.root), "worker": worker, "workers": workers, "backend": "fake",
+            "backend_options": {"latency": latency}, "prescreen": "off", "rps": None, "max_retries": 0,
+            "chunk_chars": None, "concurrency": 4, "pack": None, "stale_after": 600.0}
+
+
+def journal_ids(run, shard):
+    with open(run.output_path(shard), 'r', encoding='utf-8') as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+def test_two_workers_never_process_the_same_shard(tmp_path):
+    run = make_run(tmp_path)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        # Both start at shard 0 so they contend for every lock
+        results = list(pool.map(run_worker, [worker_options(run, latency=0.02)] * 2))
+
+    claimed = results[0]["shards"] + results[1]["shards"]
+    assert sorted(claimed) == list(range(SHARDS))
+    assert sum(stats["analyzed"] for stats in results) == ITEMS
+    for shard in range(SHARDS):
+        ids = journal_ids(run, shard)
+        assert len(ids) == len(set(ids))
+
+
+def test_concurrent_claims_of_a_stale_lock_have_one_winner(tmp_path):
+    run = make_run(tmp_path)
+    lock = run.lock_path(0)
+    lock.write_text("dead-host 1 0\n")
+    old = time.time() - 3600
+    os.utime(lock, (old, old))
+    barrier = threading.Barrier(8)
+    claims = []
+
+    def claim():
+        barrier.wait()
+        claims.append(run.claim(0, stale_after=60))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert claims.count(True) == 1
+    assert lock.read_text() != "dead-host 1 0\n"
+
+
+def test_a_fresh_lock_is_not_taken_over(tmp_path):
+    run = make_run(tmp_path)
+    assert run.claim(0, stale_after=60)
+    assert not run.claim(0, stale_after=60)
+
+
+def test_a_rerun_resumes_only_unfinished_shards(tmp_path):
+    run = make_run(tmp_path)
+    run_worker(worker_options(run))
+    # Shard 2 was interrupted after two of its analyses
+    ids = journal_ids(run, 2)
+    with open(run.output_path(2), 'r', encoding='utf-8') as f:
+        kept = f.readlines()[:2]
+    run.output_path(2).write_text("".join(kept))
+    run.done_path(2).unlink()
+
+    stats = run_worker(worker_options(run))
+
+    assert stats["shards"] == [2]
+    assert stats["skipped"] == 2
+    assert stats["analyzed"] == len(ids) - 2
+    assert all(run.is_done(shard) for shard in range(SHARDS))
+
+
+def test_merge_writes_each_record_once(tmp_path):
+    run = make_run(tmp_path)
+    run_worker(worker_options(run))
+    # A retried item can appear twice in a shard journal
+    with open(run.output_path(0), 'r', encoding='utf-8') as f:
+        first = f.readline()
+    with open(run.output_path(0), 'a', encoding='utf-8') as f:
+        f.write(first)
+
+    merge_corpus(argparse.Namespace(run_dir=str(run.root), partial=False, output_format="jsonl",
+                                    export=None, export_format="sqlite"))
+
+    with open(run.root / "merged" / "analyses.jsonl", 'r', encoding='utf-8') as f:
+        merged = [json.loads(line)["id"] for line in f]
+    assert sorted(merged) == sorted(f"posting-{n}" for n in range(ITEMS))
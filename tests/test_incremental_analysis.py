@@ -0,0 +1,24 @@
+import asyncio
+
+from incremental_analysis import IncrementalAnalyzer
+from job_bias_detector_args import JobBiasDetector
+from model_backends import FakeBackend
+
+SENTENCES = [f"Sentence number {n} describes part of the role in some detail." for n in range(14)]
+SENTENCES[3] = "We want a young team player who will crush targets every quarter."
+
+
+def test_an_edit_resends_only_the_changed_sentence_and_its_neighbours():
+    analyzer = IncrementalAnalyzer(JobBiasDetector(backend=FakeBackend()))
+    edited = list(SENTENCES)
+    edited[9] = "Sentence number 9 now talks about long hours instead."
+
+    first = asyncio.run(analyzer.analyze(" ".join(SENTENCES)))
+    assert analyzer.last_stats == {"sentences_sent": 14, "sentences_reused": 0}
+    second = asyncio.run(analyzer.analyze(" ".join(edited)))
+
+    assert analyzer.last_stats == {"sentences_sent": 3, "sentences_reused": 11}
+    assert {term["term"] for term in first.flagged_terms} == {"young", "crush targets"}
+    assert {term["term"] for term in second.flagged_terms} == {"young", "crush targets", "long hours"}
+    assert second["improved_description"].count("Sentence number") == 13
+    assert "young" not in second["improved_description"]
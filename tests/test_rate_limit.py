@@ -0,0 +1,55 @@
+import asyncio
+
+from fake_model import FakeGenerativeModel
+from job_bias_detector_args import JobBiasDetector
+from model_backends import FakeBackend
+from rate_limit import ResilientModel
+
+
+def test_calls_are_not_capped_by_the_default_executor():
+    model = FakeGenerativeModel(latency=0.2)
+    client = ResilientModel(model, max_concurrency=16)
+
+    async def run():
+        await asyncio.gather(*(client.generate_content_async(f"call {n}") for n in range(16)))
+
+    asyncio.run(run())
+    assert model.max_in_flight == 16
+
+
+def test_streams_are_not_capped_by_the_default_executor():
+    model = FakeGenerativeModel(latency=0.2)
+    client = ResilientModel(model, max_concurrency=16)
+
+    async def consume(n):
+        return "".join([text async for text in client.stream_content_async(f"call {n}")])
+
+    async def run():
+        await asyncio.gather(*(consume(n) for n in range(16)))
+
+    asyncio.run(run())
+    assert model.max_in_flight == 16
+
+
+def test_timed_out_calls_keep_their_slot_until_the_thread_returns():
+    model = FakeGenerativeModel(latency=0.5)
+    client = ResilientModel(model, max_retries=2, base_delay=0, timeout=0.1, max_concurrency=2)
+
+    async def run():
+        return await asyncio.gather(*(client.generate_content_async(f"call {n}") for n in range(2)),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert model.max_in_flight == 2
+    # Each retry waited for a slot instead of timing out while queued behind the stuck call
+    assert model.calls == 6
+    assert all(str(error) == "timeout after 3 attempts: no response within 0.1s" for error in errors)
+
+
+def test_detector_concurrency_above_the_default_call_limit_is_not_capped():
+    backend = FakeBackend(latency=0.2)
+    detector = JobBiasDetector(backend=backend, history_window=0, max_concurrency=64)
+    descriptions = [f"We need a young rockstar #{n}" for n in range(64)]
+
+    asyncio.run(detector.analyze_multiple_descriptions(descriptions, 64))
+    assert backend.models[-1].max_in_flight == 64
@@ -0,0 +1,25 @@
+import asyncio
+import json
+
+from report_writer import ReportWriter
+
+ANALYSIS = {"flagged_terms": [], "discrimination_score": 0, "confidence_level": 1}
+
+
+def test_jsonl_items_are_on_disk_before_they_count_as_written(tmp_path):
+    on_disk = []
+
+    def written(item_id, report):
+        # Read back through a separate handle, as a resumed run would
+        lines = (tmp_path / "analyses.jsonl").read_text().splitlines()
+        on_disk.append(item_id in {json.loads(line)["id"] for line in lines})
+
+    async def run():
+        writer = ReportWriter(tmp_path, "jsonl")
+        for n in range(20):
+            await writer.write(f"item-{n}", ANALYSIS, written)
+        await writer.close()
+        return writer.written
+
+    assert asyncio.run(run()) == 20
+    assert on_disk == [True] * 20
@@ -0,0 +1,20 @@
+import pytest
+
+from response_parser import AnalysisParseError, parse_analysis, parse_analysis_batch
+
+
+@pytest.mark.parametrize("raw", ['{}', '{"note": "I cannot help with that"}',
+                                 '{"discrimination_score": 3}', '{"discrimination_score": 3, "flagged_terms": "x"}'])
+def test_analysis_without_required_fields_is_rejected(raw):
+    with pytest.raises(AnalysisParseError):
+        parse_analysis(raw)
+
+
+def test_error_result_needs_only_its_error():
+    assert parse_analysis({"error": "timeout"}).is_error
+
+
+def test_batch_leaves_out_items_without_analysis_fields():
+    raw = ('[{"id": "item-0", "discrimination_score": 2, "flagged_terms": []},'
+           ' {"id": "item-1"}, {"id": "item-2", "analysis": {"note": "skipped"}}]')
+    assert list(parse_analysis_batch(raw)) == ["item-0"]
@@ -0,0 +1,134 @@
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+from bias_matcher import summarize_categories
+from response_parser import AnalysisResult
+
+# Descriptions longer than this are split and their chunks analyzed concurrently
+DEFAULT_CHUNK_CHARS = 6000
+
+# Sentences of the previous chunk sent along as read-only context
+DEFAULT_OVERLAP_SENTENCES = 1
+
+# A sentence ends at . ! or ? followed by whitespace; a line break always ends a segment,
+# so bullet lists and paragraphs without final punctuation split too
+SEGMENT_BREAK = re.compile(r'((?<=[.!?])\s+|\s*\n\s*)')
+
+
+def split_sentences(text: str) -> List[Tuple[str, str]]:
+    """Split text into ``(separator, sentence)`` pairs.
+
+    ``separator`` is the whitespace that preceded the sentence in the
+    original text, so joining the pairs back together reproduces the text
+    apart from leading and trailing whitespace.
+    """
+    segments = []
+    separator = ""
+    for position, part in enumerate(SEGMENT_BREAK.split(text)):
+        if position % 2:
+            separator += part
+        elif part:
+            segments.append((separator if segments else "", part))
+            separator = ""
+    return segments
+
+
+def _split_long_sentence(separator: str, sentence: str, max_chars: int) -> List[Tuple[str, str]]:
+    """Break a sentence longer than max_chars at spaces, or hard if it has none."""
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append((separator, sentence[:cut]))
+        separator = " " if sentence[cut:cut + 1] == " " else ""
+        sentence = sentence[cut:].lstrip(' ')
+    if sentence:
+        pieces.append((separator, sentence))
+    return pieces
+
+
+def chunk_description(text: str, max_chars: int = DEFAULT_CHUNK_CHARS,
+                      overlap_sentences: int = DEFAULT_OVERLAP_SENTENCES) -> List[Dict[str, str]]:
+    """Split a long description into chunks of at most max_chars at sentence boundaries.
+
+    Each chunk is a dict with its ``text``, the ``separator`` that joins it
+    to the previous chunk, and ``context``: the last ``overlap_sentences``
+    sentences of the previous chunk, which the model sees but does not
+    analyze or rewrite, so terms whose meaning spans a boundary are judged
+    in context without being reported twice.
+    """
+    segments = []
+    for separator, sentence in split_sentences(text):
+        segments.extend(_split_long_sentence(separator, sentence, max_chars))
+
+    chunks = []
+    current: List[Tuple[str, str]] = []
+    size = 0
+
+    def flush():
+        previous = chunks[-1]["sentences"] if chunks else []
+        overlap = previous[-overlap_sentences:] if overlap_sentences > 0 else []
+        chunks.append({
+            "text": current[0][1] + "".join(separator + sentence for separator, sentence in current[1:]),
+            "separator": current[0][0],
+            "context": " ".join(overlap),
+            "sentences": [sentence for _, sentence in current],
+        })
+
+    for separator, sentence in segments:
+        cost = len(separator) + len(sentence)
+        if current and size + cost > max_chars:
+            flush()
+            current = []
+            size = 0
+        current.append((separator, sentence))
+        size += cost
+    if current:
+        flush()
+
+    for chunk in chunks:
+        del chunk["sentences"]
+    return chunks
+
+
+def _term_key(term: Dict[str, Any]) -> Tuple[str, str]:
+    """Identity of a flagged term: the term and its context, ignoring case and spacing."""
+    return term["term"].strip().lower(), " ".join(term["context"].split()).lower()
+
+
+def _unique_texts(texts: Sequence[str]) -> str:
+    return " ".join(dict.fromkeys(text.strip() for text in texts if text.strip()))
+
+
+def merge_chunk_analyses(chunks: List[Dict[str, str]], analyses: List[AnalysisResult]) -> AnalysisResult:
+    """Combine per-chunk analyses into one analysis of the whole description.
+
+    Flagged terms are de-duplicated by term and context (keeping the most
+    severe reading), discrimination_categories are recounted from the merged
+    terms, the score is that of the worst chunk and the confidence that of
+    the least certain one. The improved descriptions are stitched back
+    together with the original separators.
+    """
+    terms: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for analysis in analyses:
+        for term in analysis.flagged_terms:
+            key = _term_key(term)
+            if key not in terms or term["severity"] > terms[key]["severity"]:
+                terms[key] = term
+    flagged_terms = list(terms.values())
+
+    improved = "".join(
+        (chunk["separator"] if position else "") + (analysis.get("improved_description") or chunk["text"])
+        for position, (chunk, analysis) in enumerate(zip(chunks, analyses))
+    )
+
+    return AnalysisResult({
+        "flagged_terms": flagged_terms,
+        "discrimination_score": max((analysis.discrimination_score for analysis in analyses), default=0),
+        "confidence_level": min((analysis.confidence_level for analysis in analyses), default=0),
+        "discrimination_categories": summarize_categories(flagged_terms),
+        "compounding_effects_summary": _unique_texts([a.get("compounding_effects_summary", "") for a in analyses]),
+        "overall_risk_assessment": _unique_texts([a.get("overall_risk_assessment", "") for a in analyses]),
+        "improved_description": improved,
+    })